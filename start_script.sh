@@ -1,5 +1,12 @@
 #!/bin/bash
 
+# With --hot, take over the ports of the ICHY already running instead of restarting it:
+# its subscribers stay connected until they drain, and new ones reach the new version
+hot_upgrade=""
+if [[ "$1" == "--hot" ]]; then
+    hot_upgrade="--hot-upgrade"
+fi
+
 # Check for uncommitted changes
 if [[ -n $(git status --porcelain) ]]; then
     echo "[$(date)] Uncommitted changes found. Skipping git pull."
@@ -22,8 +29,8 @@ latest_file=$(ls ICHY-*.py 2>/dev/null | sort -V | tail -n 1)
 
 # Check if the latest_file variable is not empty
 if [[ -n "$latest_file" ]]; then
-    echo "Running the latest script: $latest_file"
-    python "$latest_file"
+    echo "Running the latest script: $latest_file $hot_upgrade"
+    python "$latest_file" $hot_upgrade
 else
     echo "No ICHY script found."
     exit 1
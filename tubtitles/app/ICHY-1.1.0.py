@@ -1,16 +1,34 @@
 import os
+import time
+
+# Startup is timed from here; roles started later report against the same origin
+STARTED = float(os.environ.setdefault("ICHY_STARTED", str(time.time())))
+
 import sys
 import json
 import asyncio
-import websockets
 import logging
 import multiprocessing
 import uuid
-import sounddevice as sd
+import random
+import signal
+import socket
 import queue  # For thread-safe queue
-from google.cloud import speech
-from google.oauth2 import service_account
-import time
+import concurrent.futures
+
+# Heavy libraries (google-cloud-speech/grpc, sounddevice, websockets) are imported
+# inside the roles that use them, so no process pays for imports it does not need
+import archiver
+import captions
+import commands
+import handoff
+import loops
+import models
+import shmfeed
+import transcripts
+from endpoint import Endpointer
+from idle import IdlePolicy
+from supervisor import Supervisor, process_memory
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,16 +38,66 @@ logger = logging.getLogger(__name__)
 with open("me.txt", 'r') as file:
     DEVICE_ID = file.read().strip()
 
+# Optional control service URL (see control.py), e.g. ws://controller:8768
+CONTROL_URL = None
+if os.path.exists("control.txt"):
+    with open("control.txt", 'r') as file:
+        CONTROL_URL = file.read().strip() or None
+
+# Optional Vosk model for spoken commands (see commands.py), e.g. vosk-model-small-en-us-0.15
+COMMAND_MODEL = None
+if os.path.exists("command_model.txt"):
+    with open("command_model.txt", 'r') as file:
+        COMMAND_MODEL = file.read().strip() or None
+
+# Microphone blocks waiting for the command recognizer; newer blocks are dropped beyond this
+MAX_COMMAND_BLOCKS = 50
+
+# Idle suspension of the Google stream (see idle.py): silence before suspending, speech
+# level, audio replayed on resume, and the target time from speech/subscriber to stream open
+IDLE_SILENCE_SECONDS = 30
+SPEECH_RMS = 500
+PREROLL_MS = 1500
+RESUME_BUDGET_MS = 500
+
+# Local endpointing (see endpoint.py): 0 waits for Google's own finals, 3 ends utterances soonest
+ENDPOINT_AGGRESSIVENESS = 2
+
+# Seconds after launch to print the memory report, once every role has initialized
+MEMORY_REPORT_DELAY = 15
+
+# Processes serving subscribers on 8766. With more than one, each binds the port with
+# SO_REUSEPORT, the kernel spreads subscribers over them, and captions reach them all
+# through a shared-memory feed of FEED_MB (see shmfeed.py)
+PUBLISH_WORKERS = 1
+FEED_MB = 4
+
+# After handing its ports to a new version, wait at most this long for subscribers to leave
+DRAIN_SECONDS = 300
+
+# Finals are also kept in this transcript log (see transcripts.py); None to disable
+TRANSCRIPT_DIR = 'transcripts'
+
+# Captured audio is kept in ARCHIVE_DIR as FLAC (with soundfile installed) or WAV
+# segments named by capture time, the clock of the transcript log; None to disable
+ARCHIVE_DIR = 'archive'
+ARCHIVE_FORMAT = 'auto'
+
+# Languages accepted by language change commands
+VALID_LANGUAGES = {'en', 'fr', 'es', 'de', 'it', 'pt', 'zh', 'ja', 'ko'}
+
 # Audio recording parameters
 RATE = 16000  # Sampling rate in Hertz
 CHUNK = int(RATE / 10)  # Size of each audio chunk (100ms)
 
-# Read the path to the Google Cloud service account key file from key.txt
-with open('key.txt', 'r') as file:
-    google_key_path = file.read().strip()
+# Google Cloud service account key file
+KEY_PATH = 'key.txt'
 
-# Set up Google Cloud credentials
-credentials = service_account.Credentials.from_service_account_file('key.txt')
+def mark(event):
+    """Logs a startup timeline entry and returns milliseconds since startup."""
+    elapsed_ms = round((time.time() - STARTED) * 1000)
+    logger.info(f"Startup +{elapsed_ms} ms: {event}")
+    return elapsed_ms
 
 def first_char_before_m(s):
     """
@@ -43,71 +111,140 @@ def first_char_before_m(s):
         return False
     return first_char < 'm'
 
-def receive_process(shared_queue, shared_data):
-    """Process that records audio and sends transcriptions to the shared queue."""
+def receive_process(shared_queue, shared_data, command_audio=None):
+    """
+    Process that records audio and sends transcriptions to the shared queue.
+    Audio is also teed to `command_audio` for command_process, if given,
+    and to the audio archive.
+    """
     import queue  # Thread-safe queue
 
-    while True:
-        current_language = shared_data['language']
-        current_uuid = shared_data['uuid']
-        user_uuid = shared_data['user_uuid']
-
-        # Initialize Google Speech client with credentials
+    archive = archiver.Archiver(ARCHIVE_DIR, DEVICE_ID, RATE, ARCHIVE_FORMAT) if ARCHIVE_DIR else None
+    # The supervisor stops roles with SIGTERM (restart, drain, shutdown); leave through
+    # the finally at the end, so the archive is closed properly
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    policy = IdlePolicy(RATE, 1000 * CHUNK // RATE, IDLE_SILENCE_SECONDS, SPEECH_RMS,
+                        PREROLL_MS, RESUME_BUDGET_MS)
+    previous_health_check_ts = time.time()
+    first_partial_ms = None
+
+    def send_health(user_uuid):
+        # Send health check message every 9 seconds
+        nonlocal previous_health_check_ts
+        if time.time() - previous_health_check_ts > 9:
+            health_msg = captions.health_message(DEVICE_ID, user_uuid, idle=policy.stats(),
+                                                 roles=shared_data.get('roles'),
+                                                 archive=archive.stats() if archive else None,
+                                                 firstPartialMs=first_partial_ms)
+            shared_queue.put(health_msg)
+            previous_health_check_ts = time.time()
+            print(json.dumps(health_msg))
+
+    endpointer = Endpointer(RATE, ENDPOINT_AGGRESSIVENESS, SPEECH_RMS)
+    backoff = 0.5  # Seconds to wait after a failed stream; grows while failures repeat
+
+    # The queue outlives each recognition stream, so audio captured while one
+    # stream finishes and the next one opens is not lost
+    audio_queue = queue.Queue()
+
+    # Define the callback for sounddevice
+    def sd_callback(indata, frames, time, status):
+        if status:
+            logger.warning(f"Sounddevice status: {status}")
+        # Put the audio data into the queue
+        data = bytes(indata)
+        audio_queue.put(data)
+        if command_audio is not None:
+            try:
+                command_audio.put_nowait(data)
+            except queue.Full:
+                pass  # Never hold up the audio callback for the command recognizer
+        if archive is not None:
+            archive.put(data)  # Only queues; the archiver's thread writes
+
+    def open_microphone():
+        import sounddevice as sd
+
+        mic = sd.RawInputStream(samplerate=RATE, blocksize=CHUNK, dtype='int16',
+                                channels=1, callback=sd_callback)
+        mic.start()
+        mark("microphone open")
+        return mic
+
+    def create_client():
+        from google.cloud import speech
+        from google.oauth2 import service_account
+
+        mark("speech library imported")
+        credentials = service_account.Credentials.from_service_account_file(KEY_PATH)
         client = speech.SpeechClient(credentials=credentials)
+        mark("speech client ready")
+        return speech, client
 
-        # Configure recognition settings
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,  # Raw 16-bit signed LE samples
-            sample_rate_hertz=RATE,
-            language_code=current_language,
-        )
-
-        streaming_config = speech.StreamingRecognitionConfig(
-            config=config,
-            interim_results=True  # Receive interim results as they become available
-        )
-
-        audio_queue = queue.Queue()
+    # The microphone opens (and starts buffering) while the Google client loads
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        mic_future = executor.submit(open_microphone)
+        speech, client = create_client()
+        mic = mic_future.result()
 
-        # Define the callback for sounddevice
-        def sd_callback(indata, frames, time, status):
-            if status:
-                logger.warning(f"Sounddevice status: {status}")
-            # Put the audio data into the queue
-            audio_queue.put(bytes(indata))
-
-        # Open the sounddevice stream
-        with sd.RawInputStream(samplerate=RATE, blocksize=CHUNK, dtype='int16',
-                               channels=1, callback=sd_callback):
-            logger.info(f"Microphone stream started with language: {current_language}")
+    try:
+        while True:
+            current_language = shared_data['language']
+            current_uuid = shared_data['uuid']
+            user_uuid = shared_data['user_uuid']
+            endpointer.reset()
+
+            # Configure recognition settings
+            config = speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,  # Raw 16-bit signed LE samples
+                sample_rate_hertz=RATE,
+                language_code=current_language,
+            )
+
+            streaming_config = speech.StreamingRecognitionConfig(
+                config=config,
+                interim_results=True  # Receive interim results as they become available
+            )
+
+            logger.info(f"Recognition stream starting with language: {current_language}")
+
+            # While the room is idle, listen locally without a recognition stream
+            while policy.suspended and shared_data['language'] == current_language:
+                if policy.observe(audio_queue.get(), subscriber_count(shared_data)):
+                    break
+                send_health(user_uuid)
+            if policy.suspended and shared_data['language'] != current_language:
+                continue
 
             # Create a generator that reads from the queue
             def generator():
+                # Replay the audio that triggered the resume first
+                preroll = policy.take_preroll()
+                policy.resumed()
+                for data in preroll:
+                    yield speech.StreamingRecognizeRequest(audio_content=data)
                 while True:
                     data = audio_queue.get()
                     if data is None:
                         break
+                    if not policy.observe(data, subscriber_count(shared_data)):
+                        break  # Room went idle; the stream is closed until it wakes up
                     yield speech.StreamingRecognizeRequest(audio_content=data)
                     # Check if language has changed
                     if shared_data['language'] != current_language:
                         logger.info(f"Language changed to {shared_data['language']}, restarting recognition.")
                         break
+                    # Half-close once the speaker has paused, so Google finalizes now
+                    # and the outer loop rolls over to a fresh stream
+                    endpointer.audio(data)
+                    if endpointer.endpoint():
+                        logger.info("Endpoint detected, closing the stream for a final.")
+                        break
 
             # Start the streaming recognition
             requests = generator()
             responses = client.streaming_recognize(streaming_config, requests)
-            previous_health_check_ts = time.time()
-            health_msg = {
-                "type": 3,
-                "id": "health",
-                "userId": user_uuid,
-                "uuid": "123",
-                "lang": "en",
-                "isHealthCheck": True,
-                "ts": int(time.time() * 1000),
-                "msg": " ",
-                "deviceId": DEVICE_ID
-            }
 
             # Initialize start_time and end_time
             start_time = None
@@ -115,48 +252,35 @@ def receive_process(shared_queue, shared_data):
             # Process the responses
             try:
                 for response in responses:
+                    backoff = 0.5
                     if start_time is None:
                         start_time = int(time.time() * 1000)
 
-                    # Send health check message every 9 seconds
-                    if (time.time() - previous_health_check_ts > 9):
-                        shared_queue.put(json.dumps(health_msg))
-                        previous_health_check_ts = time.time()
-                        print(json.dumps(health_msg))
+                    send_health(user_uuid)
                     if not response.results:
                         continue
                     result = response.results[0]
                     if not result.alternatives:
                         continue
                     transcript = result.alternatives[0].transcript
+                    if shared_data['paused']:
+                        start_time = None
+                        continue
 
                     if result.is_final:
+                        endpointer.final()
+
                         # Set end_time when speech ends
                         end_time = int(time.time() * 1000)
 
                         # Final transcription result
                         logger.info(f"Recognized: {transcript}")
 
-                        # Create metadata object
-                        metadata = {
-                            "start_time": start_time,
-                            "end_time": end_time
-                        }
-
-                        # Append metadata to the message
-                        metadata_str = json.dumps(metadata)
-                        msg_with_metadata = transcript + metadata_str
-
-                        recognized_msg = {
-                            "userId": user_uuid,
-                            "type": 1,  # Type 1 for final results
-                            "deviceId": DEVICE_ID,
-                            "msg": msg_with_metadata,
-                            "ts": int(time.time() * 1000),
-                            "uuid": shared_data['uuid'],
-                            "lang": current_language
-                        }
-                        shared_queue.put(json.dumps(recognized_msg))
+                        recognized_msg = captions.caption_message(
+                            captions.FINAL, transcript, DEVICE_ID, user_uuid,
+                            shared_data['uuid'], current_language, start_time, end_time
+                        )
+                        shared_queue.put(recognized_msg)
 
                         # Reset start_time and end_time for the next message
                         start_time = None
@@ -167,27 +291,15 @@ def receive_process(shared_queue, shared_data):
                     else:
                         # Interim transcription result
                         logger.info(f"Partial: {transcript}")
+                        if first_partial_ms is None:
+                            first_partial_ms = mark("first partial")
+                        endpointer.partial(transcript)
 
-                        # Create metadata object
-                        metadata = {
-                            "start_time": start_time,
-                            "end_time": None
-                        }
-
-                        # Append metadata to the message
-                        metadata_str = json.dumps(metadata)
-                        msg_with_metadata = transcript + metadata_str
-
-                        partial_msg = {
-                            "userId": user_uuid,
-                            "type": 0,  # Type 0 for interim results
-                            "deviceId": DEVICE_ID,
-                            "msg": msg_with_metadata,
-                            "ts": int(time.time() * 1000),
-                            "uuid": shared_data['uuid'],
-                            "lang": current_language
-                        }
-                        shared_queue.put(json.dumps(partial_msg))
+                        partial_msg = captions.caption_message(
+                            captions.PARTIAL, transcript, DEVICE_ID, user_uuid,
+                            shared_data['uuid'], current_language, start_time
+                        )
+                        shared_queue.put(partial_msg)
 
                     # Check if language has changed
                     if shared_data['language'] != current_language:
@@ -195,75 +307,245 @@ def receive_process(shared_queue, shared_data):
                         break
 
             except Exception as e:
-                logger.error(f"Exception in receive_process: {e}")
+                logger.error(f"Exception in receive_process: {e}; retrying in ~{backoff:.1f}s")
+                time.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, 30.0)
             # At this point, the outer while loop restarts
+    finally:
+        mic.close()
+        if archive is not None:
+            archive.close()  # Writes what is still buffered and finalizes the segment
+
+async def stop_accepting_when_draining(server, shared_data, tasks=()):
+    """
+    Stops accepting new connections once the ports are handed to a new version,
+    and cancels `tasks` that must not outlive this instance's role, such as the
+    control agent, which would otherwise fight the new version's agent for the
+    same device id. Raises if one of the tasks fails first.
+    """
+    while not shared_data.get('draining'):
+        for task in tasks:
+            if task.done():
+                task.result()  # Re-raises its error so the supervisor restarts the role
+        await asyncio.sleep(0.2)
+    # Only the listening socket closes; open connections keep being served
+    server.server.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    logger.info("Draining: no longer accepting connections")
+
+def subscriber_count(shared_data):
+    """Subscribers connected to all publish workers together."""
+    return sum(count for key, count in shared_data.items() if key.startswith('subscribers:'))
+
+def feed_process(shared_queue, feed):
+    """Process that copies messages from the shared queue into the feed read by the publish workers."""
+    writer = shmfeed.Feed(feed)
+    log = transcripts.TranscriptLog(TRANSCRIPT_DIR) if TRANSCRIPT_DIR else None
+    while True:
+        message = shared_queue.get()
+        writer.publish(json.dumps(message).encode())
+        if log:
+            log.append(message)
 
-def publish_process(shared_queue):
-    """Process that sends messages from the shared queue over a WebSocket."""
-    async def publish_messages(websocket, path):
+def publish_process(shared_queue, shared_data, listener, index=0, feed=None):
+    """
+    Process that fans messages out to WebSocket subscribers, read from the
+    shared queue or, when there are several publish workers, from the feed.
+    """
+    import websockets
+    from hub import Hub
+
+    # Subscriber count is shared so receive_process can suspend recognition when nobody listens
+    count_key = f'subscribers:{index}'
+    shared_data[count_key] = 0
+    hub = Hub(on_change=lambda count: shared_data.update({count_key: count}))
+
+    async def pump_messages():
+        # Blocking queue reads happen on an executor thread so the server stays responsive
+        loop = asyncio.get_running_loop()
+        log = transcripts.TranscriptLog(TRANSCRIPT_DIR) if TRANSCRIPT_DIR else None
         while True:
-            if not shared_queue.empty():
-                message = shared_queue.get()
-                await websocket.send(message)
-                logger.info(f"Published message: {message}")
+            message = await loop.run_in_executor(None, shared_queue.get)
+            delivered = hub.publish(message)
+            if log:
+                # Only queues the final; the log's own thread does the disk writes
+                log.append(message)
+            logger.debug(f"Published message to {delivered} subscribers: {message}")
+
+    async def pump_feed():
+        # Every worker reads every message; the text is reused for sending as is
+        reader = shmfeed.FeedReader(feed)
+        async for data in reader.messages():
+            text = data.decode()
+            hub.publish(json.loads(text), text)
+
+    async def serve():
+        # Start the WebSocket server; subscribers declare topics in the URL query string
+        server = await websockets.serve(hub.handler, sock=listener)
+        mark(f"publish worker {index} serving on 8766")
+        asyncio.create_task(stop_accepting_when_draining(server, shared_data))
+        await (pump_feed() if feed else pump_messages())
+
+    # uvloop when installed (see loops.py)
+    loops.run(serve())
+
+def apply_language(shared_data, lang_code):
+    """Switches the captioning language. Returns (ok, error)."""
+    if lang_code not in VALID_LANGUAGES:
+        logger.warning(f"Received invalid language code: {lang_code}")
+        return False, f"invalid language code: {lang_code}"
+    shared_data['language'] = lang_code
+    logger.info(f"Language for {DEVICE_ID} changed to {lang_code}")
+    return True, None
+
+def apply_paused(shared_data, paused):
+    """Pauses or resumes publishing captions; health checks continue either way."""
+    shared_data['paused'] = paused
+    logger.info(f"Captions for {DEVICE_ID} {'paused' if paused else 'resumed'}")
+
+def command_process(shared_data, command_audio):
+    """Process that recognizes spoken commands in the microphone audio and applies them locally."""
+    recognizer = commands.CommandRecognizer(models.get_model(models.resolve_model(COMMAND_MODEL)), RATE)
+    logger.info(f"Voice commands enabled with model {COMMAND_MODEL}")
+    while True:
+        pcm = command_audio.get()
+        for command in recognizer.accept(pcm):
+            if command[0] == "language":
+                apply_language(shared_data, command[1])
             else:
-                await asyncio.sleep(0.1)  # Sleep briefly to prevent busy waiting
-
-    # Start the WebSocket server
-    start_server = websockets.serve(publish_messages, "0.0.0.0", 8766)
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
+                apply_paused(shared_data, command[0] == "pause")
 
-def language_receiver_process(shared_data):
+def language_receiver_process(shared_data, listener):
     """Process that listens for language change commands over a separate WebSocket."""
-    valid_languages = {'en', 'fr', 'es', 'de', 'it', 'pt', 'zh', 'ja', 'ko'}  # Define valid languages
+    import websockets
 
     async def receive_language_commands(websocket, path):
         async for message in websocket:
             try:
                 data = json.loads(message)
-                for device_id, lang_code in data.items():
-                    if device_id == DEVICE_ID:
-                        # Check if lang_code is valid
-                        if lang_code in valid_languages:
-                            shared_data['language'] = lang_code
-                            logger.info(f"Language for {DEVICE_ID} changed to {lang_code}")
-                        else:
-                            logger.warning(f"Received invalid language code: {lang_code}")
+                if data.get("op") == "state":
+                    reply = {"deviceId": DEVICE_ID, "ok": True, "lang": shared_data['language'],
+                             "paused": shared_data['paused']}
+                elif DEVICE_ID in data:
+                    # Only the entry addressed to this device matters
+                    ok, error = apply_language(shared_data, data[DEVICE_ID])
+                    reply = {"deviceId": DEVICE_ID, "ok": ok, "error": error, "lang": shared_data['language']}
+                else:
+                    continue
+                await websocket.send(json.dumps(reply))
             except json.JSONDecodeError as e:
                 logger.error(f"Invalid JSON received: {message}")
             except Exception as e:
                 logger.error(f"Exception in receive_language_commands: {e}")
 
-    # Start the WebSocket server on a different port (e.g., 8767)
-    start_server = websockets.serve(receive_language_commands, "0.0.0.0", 8767)
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
+    async def serve():
+        # Start the WebSocket server on a different port (e.g., 8767)
+        server = await websockets.serve(receive_language_commands, sock=listener)
+        mark("accepting language commands on 8767")
+
+        # Also keep a persistent connection to the control service, if one is configured,
+        # until the ports are handed over: from then on the new version's agent takes commands
+        agents = []
+        if CONTROL_URL:
+            import control
+
+            agents.append(asyncio.create_task(control.device_agent(
+                CONTROL_URL,
+                DEVICE_ID,
+                lambda lang_code: apply_language(shared_data, lang_code),
+                lambda: shared_data['language'],
+            )))
+        await stop_accepting_when_draining(server, shared_data, agents)
+        await server.wait_closed()
+
+    loops.run(serve())
+
+def drain(shared_data, supervisor):
+    """Stops this instance once its subscribers have moved to the new version."""
+    shared_data['draining'] = True
+    deadline = time.time() + DRAIN_SECONDS
+    while subscriber_count(shared_data) and time.time() < deadline:
+        time.sleep(0.5)
+    logger.info(f"Drained with {subscriber_count(shared_data)} subscribers left; exiting")
+    supervisor.stop()
+
+def report_memory(supervisor, manager):
+    """Prints the memory of every process of this device, and their total."""
+    report = supervisor.memory()
+    report['main'] = process_memory(os.getpid())
+    report['manager'] = process_memory(manager._process.pid)
+    total = round(sum(memory.get('pssMb', 0) for memory in report.values()), 1)
+    print(json.dumps({"deviceId": DEVICE_ID, "memory": report, "totalPssMb": total}))
 
 if __name__ == "__main__":
+    import argparse
+    import threading
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hot-upgrade", action="store_true",
+                        help="Take over the ports of the running version instead of binding them")
+    parser.add_argument("--start-method", default="forkserver", choices=("forkserver", "spawn", "fork"),
+                        help="How roles are started; with forkserver or spawn each role imports only "
+                             "what it uses instead of inheriting this process")
+    args = parser.parse_args()
+    context = multiprocessing.get_context(args.start_method)
+
+    # Listening sockets are created here and shared with the roles, so they can be handed over
+    listeners, state = handoff.receive() if args.hot_upgrade else ({}, {})
+    publish_listeners = [sock for name, sock in sorted(listeners.items()) if name.startswith("publish")]
+    if not publish_listeners:
+        publish_listeners = [handoff.listen(8766, reuse_port=PUBLISH_WORKERS > 1)]
+    # More workers can join the received sockets only if those were bound with SO_REUSEPORT
+    if publish_listeners[0].getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT):
+        while len(publish_listeners) < PUBLISH_WORKERS:
+            publish_listeners.append(handoff.listen(8766, reuse_port=True))
+    control_listener = listeners.get("control") or handoff.listen(8767)
+
     # Manager for shared resources between processes
-    manager = multiprocessing.Manager()
+    manager = context.Manager()
     shared_queue = manager.Queue()
     shared_data = manager.dict()
     shared_data['uuid'] = str(uuid.uuid4())  # Shared UUID
     shared_data['user_uuid'] = str(uuid.uuid4())  # User UUID
-    shared_data['language'] = 'en'  # Default language is 'en'
-
-    # Create and start the receive, publish, and language receiver processes
-    receive_p = multiprocessing.Process(
-        target=receive_process, args=(shared_queue, shared_data)
-    )
-    publish_p = multiprocessing.Process(
-        target=publish_process, args=(shared_queue,)
-    )
-    language_receiver_p = multiprocessing.Process(
-        target=language_receiver_process, args=(shared_data,)
+    shared_data['language'] = state.get('language', 'en')  # Default language is 'en'
+    shared_data['paused'] = state.get('paused', False)
+
+    # Bounded tee of microphone audio for the voice command recognizer, if enabled
+    command_audio = context.Queue(MAX_COMMAND_BLOCKS) if COMMAND_MODEL else None
+
+    # Run the receive, publish, and language receiver processes, restarting any that dies;
+    # restart counts and recovery times go out with the health checks
+    supervisor = Supervisor(context=context, on_change=lambda stats: shared_data.update(roles=stats))
+    supervisor.add("receive", receive_process, (shared_queue, shared_data, command_audio))
+    feed = None
+    if len(publish_listeners) == 1:
+        supervisor.add("publish", publish_process, (shared_queue, shared_data, publish_listeners[0]))
+    else:
+        feed = shmfeed.feed_path(f"ichy-{os.getpid()}")
+        shmfeed.Feed(feed, capacity=FEED_MB * 1024 * 1024).close()
+        supervisor.add("feed", feed_process, (shared_queue, feed))
+        for index, listener in enumerate(publish_listeners):
+            supervisor.add(f"publish{index}", publish_process, (shared_queue, shared_data, listener, index, feed))
+    supervisor.add("language_receiver", language_receiver_process, (shared_data, control_listener))
+    if command_audio is not None:
+        supervisor.add("command", command_process, (shared_data, command_audio))
+
+    # Offer the ports to the next version started with --hot-upgrade, then drain
+    handoff.HandoffServer(
+        {**{f"publish{index}": sock for index, sock in enumerate(publish_listeners)}, "control": control_listener},
+        lambda: {'language': shared_data['language'], 'paused': shared_data['paused']},
+        lambda: threading.Thread(target=drain, args=(shared_data, supervisor), daemon=True).start(),
     )
-
-    receive_p.start()
-    publish_p.start()
-    language_receiver_p.start()
-
-    receive_p.join()
-    publish_p.join()
-    language_receiver_p.join()
+    mark("starting roles")
+    memory_timer = threading.Timer(MEMORY_REPORT_DELAY, report_memory, args=(supervisor, manager))
+    memory_timer.daemon = True
+    memory_timer.start()
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        supervisor.stop()
+    finally:
+        if feed is not None:
+            os.unlink(feed)
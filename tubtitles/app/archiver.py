@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import wave
+import queue
+import argparse
+import logging
+import threading
+import importlib.util
+
+import audio
+import captions
+
+# soundfile (and numpy with it) is only imported once a FLAC segment is opened
+HAVE_SOUNDFILE = importlib.util.find_spec("soundfile") is not None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("auto", "flac", "wav")
+
+# A new segment starts this often, and whenever the audio has a gap (dropped
+# blocks, a restart), so a segment's sample offset plus its start time in the
+# file name is always the capture time, the same clock as the transcript log
+SEGMENT_SECONDS = 300
+GAP_MS = 500
+
+# Blocks waiting for the writer (100 ms each); beyond this they are dropped
+MAX_PENDING = 600
+# Audio is written to disk in pieces of this size
+WRITE_BYTES = 1024 * 1024
+
+SEGMENT_NAME = re.compile(r"^(?P<device>.+)-(?P<start>\d{13,})\.(?P<ext>wav|flac)$")
+
+
+class _WavSegment:
+    def __init__(self, path, rate):
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(audio.SAMPLE_WIDTH)
+        self._wav.setframerate(rate)
+
+    def write(self, pcm):
+        # wave patches the header after every write, so a crash loses at most the last write
+        self._wav.writeframes(pcm)
+
+    def close(self):
+        self._wav.close()
+
+
+class _FlacSegment:
+    def __init__(self, path, rate):
+        import soundfile
+
+        self._file = soundfile.SoundFile(path, "w", rate, 1, "PCM_16", format="FLAC")
+
+    def write(self, pcm):
+        self._file.buffer_write(pcm, dtype="int16")
+
+    def close(self):
+        self._file.close()
+
+
+class Archiver:
+    """
+    Keeps the captured audio in rotating FLAC (with soundfile installed) or WAV
+    segments named <device>-<epoch ms of the first sample>. put() is called from
+    the audio callback and only appends to a bounded queue; a background
+    thread does the encoding and large buffered writes. If the writer falls
+    MAX_PENDING blocks behind, new blocks are dropped and counted.
+    """
+
+    def __init__(self, directory, device_id, rate, fmt="auto", segment_seconds=SEGMENT_SECONDS,
+                 max_pending=MAX_PENDING, write_bytes=WRITE_BYTES):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown archive format {fmt}; expected one of {FORMATS}")
+        if fmt == "flac" and not HAVE_SOUNDFILE:
+            raise ImportError("FLAC archives need soundfile (pip install soundfile)")
+        self.format = fmt if fmt != "auto" else ("flac" if HAVE_SOUNDFILE else "wav")
+        self.directory = directory
+        self.device_id = re.sub(r"[^\w.]", "_", device_id)
+        self.rate = rate
+        self.segment_bytes = segment_seconds * rate * audio.SAMPLE_WIDTH
+        self.write_bytes = write_bytes
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.blocks = 0
+        self.dropped = 0
+        self.segments = 0
+        self.lag_ms = 0
+        self.max_lag_ms = 0
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="audio-archiver", daemon=True)
+        self._thread.start()
+
+    def put(self, pcm, ts_ms=None):
+        """Queues a block captured at ts_ms (epoch ms of its first sample). Never blocks."""
+        if ts_ms is None:
+            ts_ms = captions.now_ms() - int(audio.duration(pcm, self.rate) * 1000)
+        try:
+            self.pending.put_nowait((ts_ms, pcm))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Audio archiver is behind; {self.dropped} blocks dropped")
+
+    def _open(self, ts_ms):
+        path = os.path.join(self.directory, f"{self.device_id}-{ts_ms}.{self.format}")
+        self.segments += 1
+        logger.info(f"Archiving audio to {path}")
+        return (_FlacSegment if self.format == "flac" else _WavSegment)(path, self.rate)
+
+    def _run(self):
+        segment = None
+        buffer = bytearray()
+        written = 0  # Bytes in the current segment, including the buffer
+        expected_ms = None  # Capture time of the next sample if nothing is missing
+
+        def flush():
+            if buffer:
+                segment.write(bytes(buffer))
+                buffer.clear()
+
+        while True:
+            try:
+                item = self.pending.get(timeout=1)
+            except queue.Empty:
+                flush()  # Capture has stopped; do not keep audio only in memory
+                continue
+            if item is None:
+                break
+            ts_ms, pcm = item
+            if segment is not None and (abs(ts_ms - expected_ms) > GAP_MS or written >= self.segment_bytes):
+                flush()
+                segment.close()
+                segment = None
+            if segment is None:
+                segment = self._open(ts_ms)
+                written = 0
+            buffer += pcm
+            written += len(pcm)
+            self.blocks += 1
+            expected_ms = ts_ms + int(audio.duration(pcm, self.rate) * 1000)
+            self.lag_ms = max(0, captions.now_ms() - expected_ms)
+            self.max_lag_ms = max(self.max_lag_ms, self.lag_ms)
+            if len(buffer) >= self.write_bytes:
+                flush()
+        if segment is not None:
+            flush()
+            segment.close()
+
+    def close(self):
+        """Writes everything queued, closes the segment and stops the writer."""
+        self.pending.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {"format": self.format, "blocks": self.blocks, "droppedBlocks": self.dropped,
+                "pendingBlocks": self.pending.qsize(), "lagMs": self.lag_ms, "maxLagMs": self.max_lag_ms,
+                "segments": self.segments}
+
+
+def segment_seconds(path):
+    if path.endswith(".flac"):
+        import soundfile
+
+        return soundfile.info(path).duration
+    with wave.open(path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def find_audio(directory, device_id, t1, t2):
+    """
+    Returns (path, from seconds, to seconds) for the archived audio of a device
+    between epoch ms t1 and t2, e.g. the times of a final from the transcript log.
+    """
+    found = []
+    for name in sorted(os.listdir(directory)):
+        match = SEGMENT_NAME.match(name)
+        if not match or match["device"] != re.sub(r"[^\w.]", "_", device_id):
+            continue
+        start = int(match["start"])
+        if start > t2:
+            continue
+        path = os.path.join(directory, name)
+        end = start + segment_seconds(path) * 1000
+        if end >= t1:
+            found.append((path, max(0, t1 - start) / 1000, (min(t2, end) - start) / 1000))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the archived audio of a device between two times.")
+    parser.add_argument("device")
+    parser.add_argument("start", type=int, help="Epoch ms")
+    parser.add_argument("end", type=int, help="Epoch ms")
+    parser.add_argument("--dir", default="archive")
+    args = parser.parse_args()
+    for path, start, end in find_audio(args.dir, args.device, args.start, args.end):
+        print(json.dumps({"path": path, "from": round(start, 3), "to": round(end, 3)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import math
+import wave
+from array import array
+
+try:
+    import audioop  # Deprecated, and removed in Python 3.13
+except ImportError:
+    audioop = None
+
+# All audio in this project is mono 16-bit signed little-endian PCM
+SAMPLE_WIDTH = 2
+
+
+def duration(pcm, rate):
+    """Duration in seconds of a block of int16 PCM."""
+    return len(pcm) / (SAMPLE_WIDTH * rate)
+
+
+def samples(pcm):
+    """Returns the int16 samples of a PCM block as an array."""
+    data = array('h')
+    data.frombytes(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH])
+    return data
+
+
+def rms(pcm):
+    """Root-mean-square energy of a block of int16 PCM (0 to 32768)."""
+    if not pcm:
+        return 0
+    if audioop is not None:
+        return audioop.rms(pcm, SAMPLE_WIDTH)
+    data = samples(pcm)
+    return int(math.sqrt(sum(x * x for x in data) / len(data))) if data else 0
+
+
+def find_wavs(paths):
+    """Expands files and directories into a sorted list of .wav files."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files if name.lower().endswith(".wav"))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def read_wav_chunks(path, chunk_ms):
+    """Reads a mono 16-bit WAV file as (rate, list of PCM chunks of chunk_ms)."""
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f"{path}: expected mono 16-bit audio")
+        rate = wav.getframerate()
+        frames = rate * chunk_ms // 1000
+        chunks = []
+        while True:
+            data = wav.readframes(frames)
+            if not data:
+                break
+            chunks.append(data)
+    return rate, chunks
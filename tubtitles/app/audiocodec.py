@@ -0,0 +1,251 @@
+"""
+Audio codecs for the device uplink. Each codec has a stateful encoder and
+decoder working on mono int16 PCM:
+
+    encoder = get_codec("adpcm").encoder(rate)
+    data = encoder.encode(pcm)
+    pcm = get_codec("adpcm").decoder(rate).decode(data)
+
+The transmitter offers the codecs it supports in its handshake, in order of
+preference, and the server answers with the first one it supports too (see
+negotiate). Encoders and decoders keep state between blocks, so each audio
+stream needs its own pair.
+"""
+import struct
+from array import array
+
+try:
+    import audioop  # Deprecated, and removed in Python 3.13
+except ImportError:
+    audioop = None
+
+try:
+    import opuslib
+except ImportError:
+    opuslib = None
+
+
+class PcmCoder:
+    def encode(self, pcm):
+        return pcm
+
+    def decode(self, data):
+        return data
+
+
+_ULAW_SEGMENTS = [0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]
+
+
+def _ulaw_encode_sample(sample):
+    # G.711 mu-law on 14-bit magnitudes, as in audioop.lin2ulaw
+    sample >>= 2
+    if sample < 0:
+        sample, mask = -sample, 0x7F
+    else:
+        mask = 0xFF
+    sample = min(sample, 8159) + 0x21
+    for segment, end in enumerate(_ULAW_SEGMENTS):
+        if sample <= end:
+            return ((segment << 4) | ((sample >> (segment + 1)) & 0x0F)) ^ mask
+    return 0x7F ^ mask
+
+
+def _ulaw_decode_sample(byte):
+    byte = ~byte & 0xFF
+    sign, exponent, mantissa = byte & 0x80, (byte >> 4) & 0x07, byte & 0x0F
+    sample = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return -sample if sign else sample
+
+
+# Lookup tables make the pure-Python mu-law path one table lookup per sample
+_ULAW_ENCODE = bytes(_ulaw_encode_sample(s - 65536 if s >= 32768 else s) for s in range(65536))
+_ULAW_DECODE = [_ulaw_decode_sample(b) for b in range(256)]
+
+
+class MulawCoder:
+    """G.711 mu-law: 8 bits per sample, stateless."""
+
+    def encode(self, pcm):
+        if audioop is not None:
+            return audioop.lin2ulaw(pcm, 2)
+        samples = array('H')
+        samples.frombytes(pcm)
+        return bytes(map(_ULAW_ENCODE.__getitem__, samples))
+
+    def decode(self, data):
+        if audioop is not None:
+            return audioop.ulaw2lin(data, 2)
+        return array('h', map(_ULAW_DECODE.__getitem__, data)).tobytes()
+
+
+_ADPCM_INDEX = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]
+_ADPCM_STEPS = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+]
+
+
+def _adpcm_encode(pcm, state):
+    # Intel/DVI IMA ADPCM with the same bit layout as audioop.lin2adpcm
+    valpred, index = state or (0, 0)
+    step = _ADPCM_STEPS[index]
+    samples = array('h')
+    samples.frombytes(pcm)
+    out = bytearray()
+    high = None
+    for value in samples:
+        diff = value - valpred
+        sign = 8 if diff < 0 else 0
+        if sign:
+            diff = -diff
+        delta = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            delta = 4
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 2
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 1
+            vpdiff += step
+        valpred = max(-32768, valpred - vpdiff) if sign else min(32767, valpred + vpdiff)
+        delta |= sign
+        index = min(max(index + _ADPCM_INDEX[delta], 0), 88)
+        step = _ADPCM_STEPS[index]
+        if high is None:
+            high = (delta << 4) & 0xF0
+        else:
+            out.append(high | delta)
+            high = None
+    if high is not None:
+        out.append(high)
+    return bytes(out), (valpred, index)
+
+
+def _adpcm_decode(data, state):
+    valpred, index = state or (0, 0)
+    step = _ADPCM_STEPS[index]
+    out = array('h')
+    for byte in data:
+        for delta in (byte >> 4, byte & 0x0F):
+            index = min(max(index + _ADPCM_INDEX[delta], 0), 88)
+            vpdiff = step >> 3
+            if delta & 4:
+                vpdiff += step
+            if delta & 2:
+                vpdiff += step >> 1
+            if delta & 1:
+                vpdiff += step >> 2
+            valpred = max(-32768, valpred - vpdiff) if delta & 8 else min(32767, valpred + vpdiff)
+            step = _ADPCM_STEPS[index]
+            out.append(valpred)
+    return out.tobytes(), (valpred, index)
+
+
+class AdpcmCoder:
+    """IMA ADPCM: 4 bits per sample. Blocks must hold an even number of samples."""
+
+    def __init__(self):
+        self._state = None
+
+    def encode(self, pcm):
+        if audioop is not None:
+            data, self._state = audioop.lin2adpcm(pcm, 2, self._state)
+        else:
+            data, self._state = _adpcm_encode(pcm, self._state)
+        return data
+
+    def decode(self, data):
+        if audioop is not None:
+            pcm, self._state = audioop.adpcm2lin(data, 2, self._state)
+        else:
+            pcm, self._state = _adpcm_decode(data, self._state)
+        return pcm
+
+
+class OpusCoder:
+    """
+    Opus via opuslib, in 20 ms frames. Each encoded frame is prefixed with its
+    length, and samples that do not fill a whole frame wait for the next block.
+    """
+
+    FRAME_MS = 20
+    LENGTH = struct.Struct("<H")
+
+    def __init__(self, rate):
+        self._frame_bytes = rate * self.FRAME_MS // 1000 * 2
+        self._encoder = opuslib.Encoder(rate, 1, opuslib.APPLICATION_VOIP)
+        self._decoder = opuslib.Decoder(rate, 1)
+        self._pending = b""
+
+    def encode(self, pcm):
+        pcm = self._pending + pcm
+        frames = []
+        frame_samples = self._frame_bytes // 2
+        usable = len(pcm) - len(pcm) % self._frame_bytes
+        for start in range(0, usable, self._frame_bytes):
+            packet = self._encoder.encode(pcm[start:start + self._frame_bytes], frame_samples)
+            frames.append(self.LENGTH.pack(len(packet)) + packet)
+        self._pending = pcm[usable:]
+        return b"".join(frames)
+
+    def decode(self, data):
+        out = []
+        frame_samples = self._frame_bytes // 2
+        offset = 0
+        while offset < len(data):
+            (length,) = self.LENGTH.unpack_from(data, offset)
+            offset += self.LENGTH.size
+            out.append(self._decoder.decode(data[offset:offset + length], frame_samples))
+            offset += length
+        return b"".join(out)
+
+
+class Codec:
+    def __init__(self, name, factory, bits_per_sample=None):
+        self.name = name
+        self._factory = factory
+        self.bits_per_sample = bits_per_sample  # None for variable bitrate
+
+    def encoder(self, rate):
+        return self._factory(rate)
+
+    def decoder(self, rate):
+        return self._factory(rate)
+
+
+CODECS = {
+    "pcm": Codec("pcm", lambda rate: PcmCoder(), 16),
+    "mulaw": Codec("mulaw", lambda rate: MulawCoder(), 8),
+    "adpcm": Codec("adpcm", lambda rate: AdpcmCoder(), 4),
+}
+if opuslib is not None:
+    CODECS["opus"] = Codec("opus", OpusCoder)
+
+# Preference order offered by transmitters: smallest first, raw PCM as the fallback
+PREFERENCE = [name for name in ("opus", "adpcm", "mulaw", "pcm") if name in CODECS]
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec {name}; expected one of {sorted(CODECS)}")
+
+
+def negotiate(offered):
+    """Picks the first offered codec this side supports, falling back to pcm."""
+    for name in offered or ():
+        if name in CODECS:
+            return name
+    return "pcm"
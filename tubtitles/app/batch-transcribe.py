@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import wave
+import hashlib
+import datetime
+import argparse
+import logging
+import concurrent.futures
+
+import srt
+
+import audio
+import models
+from engines import create_engine
+
+logger = logging.getLogger(__name__)
+
+# Audio is split into pieces of about TARGET_MS at a silence of at least
+# MIN_SILENCE_MS, so no utterance is cut; without such a silence a piece ends
+# at its quietest 10 ms frame before MAX_MS
+TARGET_MS = 30000
+MAX_MS = 60000
+MIN_SILENCE_MS = 300
+FRAME_MS = 10
+
+# Pieces are fed to the recognizer in blocks of this length
+CHUNK_MS = 100
+
+CACHE_DIR = ".transcribe-cache"
+
+_engine = None
+
+
+def find_audio(paths):
+    """Expands files and directories into a sorted list of .wav (and .flac) files."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files
+                             if name.lower().endswith((".wav", ".flac")))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def read_audio(path):
+    """Reads a mono 16-bit WAV (or, with soundfile installed, FLAC) file as (rate, pcm)."""
+    if path.lower().endswith(".flac"):
+        import soundfile
+
+        with soundfile.SoundFile(path) as file:
+            if file.channels != 1:
+                raise ValueError(f"{path}: expected mono audio")
+            return file.samplerate, file.buffer_read(dtype="int16").tobytes()
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != audio.SAMPLE_WIDTH:
+            raise ValueError(f"{path}: expected mono 16-bit audio")
+        return wav.getframerate(), wav.readframes(wav.getnframes())
+
+
+def split(pcm, rate, threshold):
+    """Returns (start, end) byte offsets of pieces cut at silences."""
+    frame = rate * FRAME_MS // 1000 * audio.SAMPLE_WIDTH
+    levels = [audio.rms(pcm[i:i + frame]) for i in range(0, len(pcm), frame)]
+    target, longest, min_silence = TARGET_MS // FRAME_MS, MAX_MS // FRAME_MS, MIN_SILENCE_MS // FRAME_MS
+    cuts = [0]
+    quiet = 0  # Length of the current run of quiet frames
+    for i, level in enumerate(levels):
+        quiet = quiet + 1 if level < threshold else 0
+        length = i - cuts[-1]
+        if length >= target and quiet >= min_silence:
+            # Cut in the middle of the silence, so both pieces keep some of it
+            cuts.append(i - quiet // 2)
+            quiet = 0
+        elif length >= longest:
+            window = range(cuts[-1] + target, i + 1)
+            cuts.append(min(window, key=lambda j: levels[j]))
+    cuts.append(len(levels))
+    return [(start * frame, min(end * frame, len(pcm))) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+def _init_worker(engine_name, engine_options):
+    # Each worker process loads its engine (and model) once
+    global _engine
+    _engine = create_engine(engine_name, **engine_options)
+
+
+def transcribe_piece(pcm, rate, lang, threshold):
+    """
+    Recognizes one piece and returns its utterances as (start ms, end ms, text)
+    relative to the piece, with the CPU seconds it took. An utterance starts at
+    its first voiced block after the previous final and ends at its last voiced
+    block, which works for any engine, whether or not it reports word times.
+    """
+    cpu = time.process_time()
+    stream = _engine.open_stream(lang, rate)
+    chunk = rate * CHUNK_MS // 1000 * audio.SAMPLE_WIDTH
+    utterances = []
+    start_ms = last_voiced_ms = None
+    for offset in range(0, len(pcm), chunk):
+        block = pcm[offset:offset + chunk]
+        block_ms = offset * 1000 // (rate * audio.SAMPLE_WIDTH)
+        if audio.rms(block) >= threshold:
+            if start_ms is None:
+                start_ms = block_ms
+            last_voiced_ms = block_ms + CHUNK_MS
+        for is_final, text in stream.accept(block):
+            if is_final and text:
+                utterances.append(_utterance(start_ms, last_voiced_ms, block_ms + CHUNK_MS, text))
+                start_ms = last_voiced_ms = None
+    for is_final, text in stream.close():
+        if is_final and text:
+            utterances.append(_utterance(start_ms, last_voiced_ms, len(pcm) * 1000 // (rate * audio.SAMPLE_WIDTH), text))
+    return utterances, time.process_time() - cpu
+
+
+def _utterance(start_ms, last_voiced_ms, now_ms, text):
+    # A final without voiced audio (below the threshold) is placed just before it was emitted
+    end_ms = last_voiced_ms or now_ms
+    return start_ms if start_ms is not None else max(0, end_ms - CHUNK_MS), end_ms, text
+
+
+def piece_key(pcm, rate, lang, threshold, engine_name, engine_options):
+    """Cache key: the audio itself plus everything that changes how it is recognized."""
+    digest = hashlib.sha256(pcm)
+    digest.update(json.dumps([rate, lang, threshold, engine_name, engine_options], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def read_cache(path):
+    """Cached utterances of a piece, or None if there are none or the entry is unreadable."""
+    try:
+        with open(path) as file:
+            return [tuple(utterance) for utterance in json.load(file)]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        # e.g. truncated by an interrupted run: recognize the piece again
+        logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+
+
+def write_cache(path, utterances):
+    # Written whole to a temporary file and renamed, so an entry is never seen half written
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(utterances, file)
+    os.replace(temporary, path)
+
+
+def write_outputs(path, out_dir, utterances, duration_seconds):
+    base = os.path.splitext(os.path.basename(path))[0]
+    directory = out_dir or os.path.dirname(path)
+    os.makedirs(directory or ".", exist_ok=True)
+    base = os.path.join(directory, base)
+    subtitles = [srt.Subtitle(i + 1, datetime.timedelta(milliseconds=start), datetime.timedelta(milliseconds=end), text)
+                 for i, (start, end, text) in enumerate(utterances)]
+    with open(base + ".srt", "w", encoding="utf-8") as file:
+        file.write(srt.compose(subtitles, reindex=False))
+    with open(base + ".json", "w", encoding="utf-8") as file:
+        json.dump({"path": path, "durationSeconds": round(duration_seconds, 3),
+                   "utterances": [{"startMs": start, "endMs": end, "text": text} for start, end, text in utterances]},
+                  file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcribe recordings on all cores: split at silences, recognize pieces in parallel, "
+                    "write SRT and JSON per file."
+    )
+    parser.add_argument("inputs", nargs="+", help="WAV/FLAC files or directories")
+    parser.add_argument("--engine", choices=("vosk", "fake"), default="vosk")
+    models.add_model_arguments(parser)
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Stand-in decoding seconds per second of audio (with --engine fake)")
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--threshold", type=int, default=500, help="RMS below which audio counts as silence")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", help="Output directory (default: next to each input)")
+    parser.add_argument("--cache", default=CACHE_DIR, help="Directory of cached piece results")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.engine == "vosk":
+        # Partials are never used here, so Vosk is not asked for them
+        engine_options = {"model_path": models.resolve_from_args(parser, args, interactive=False),
+                          "partial_every": 1 << 30}
+    else:
+        engine_options = {"delay": args.delay, "threshold": args.threshold}
+    if not args.no_cache:
+        os.makedirs(args.cache, exist_ok=True)
+
+    started = time.perf_counter()
+    files = []  # [path, duration, pieces, pieces waiting, failed]; each piece is [offset ms, cache path, utterances, file]
+    skipped = []
+    audio_seconds = 0.0
+    cached = 0
+    cpu_seconds = 0.0
+
+    def finish(file):
+        # Written as soon as the file's last piece is in, so an interrupted run keeps what is done
+        path, duration, pieces, _, failed = file
+        if failed:
+            skipped.append(path)
+            return
+        # Piece times are relative to the piece; its offset puts them on the file's timeline
+        utterances = [(offset_ms + start, offset_ms + end, text)
+                      for offset_ms, _, results, _ in pieces for start, end, text in results]
+        write_outputs(path, args.out, utterances, duration)
+
+    with concurrent.futures.ProcessPoolExecutor(args.workers, initializer=_init_worker,
+                                                initargs=(args.engine, engine_options)) as pool:
+        futures = {}
+        # Enough pieces in flight to keep every worker busy, few enough that the
+        # corpus's audio is not all held in pending futures at once
+        max_in_flight = 2 * args.workers
+
+        def collect(done):
+            nonlocal cpu_seconds
+            for future in done:
+                piece = futures.pop(future)
+                file = piece[3]
+                try:
+                    piece[2], cpu = future.result()
+                except Exception as e:
+                    logger.error(f"{file[0]}: recognizing the piece at {piece[0]} ms failed: {e}")
+                    file[4] = True
+                else:
+                    cpu_seconds += cpu
+                    if not args.no_cache:
+                        write_cache(piece[1], piece[2])
+                file[3] -= 1
+                if file[3] == 0:
+                    finish(file)
+
+        for path in find_audio(args.inputs):
+            try:
+                rate, pcm = read_audio(path)
+            except (OSError, EOFError, ValueError, RuntimeError, ImportError, wave.Error) as e:
+                logger.error(f"Skipping {path}: {e}")
+                skipped.append(path)
+                continue
+            duration = audio.duration(pcm, rate)
+            audio_seconds += duration
+            # Counts one extra until the file is fully cut, so it cannot finish early
+            file = [path, duration, [], 1, False]
+            files.append(file)
+            for start, end in split(pcm, rate, args.threshold):
+                offset_ms = start * 1000 // (rate * audio.SAMPLE_WIDTH)
+                key = piece_key(pcm[start:end], rate, args.lang, args.threshold, args.engine, engine_options)
+                cache_path = os.path.join(args.cache, key + ".json")
+                piece = [offset_ms, cache_path, None if args.no_cache else read_cache(cache_path), file]
+                file[2].append(piece)
+                if piece[2] is not None:
+                    cached += 1
+                    continue
+                while len(futures) >= max_in_flight:
+                    done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect(done)
+                # Submitted as soon as it is cut, so workers start while later files are read
+                futures[pool.submit(transcribe_piece, pcm[start:end], rate, args.lang, args.threshold)] = piece
+                file[3] += 1
+            logger.info(f"{path}: {duration:.1f} s in {len(file[2])} pieces")
+            file[3] -= 1
+            if file[3] == 0:
+                finish(file)
+
+        collect(list(concurrent.futures.as_completed(futures)))
+
+    wall = time.perf_counter() - started
+    json.dump({
+        "files": len(files) - sum(failed for *_, failed in files),
+        "skippedFiles": skipped,
+        "pieces": sum(len(file[2]) for file in files),
+        "cachedPieces": cached,
+        "workers": args.workers,
+        "audioSeconds": round(audio_seconds, 1),
+        "wallSeconds": round(wall, 2),
+        "workerCpuSeconds": round(cpu_seconds, 2),
+        # Real-time factor: processing time per second of audio (below 1 is faster than real time)
+        "rtf": round(wall / audio_seconds, 4) if audio_seconds else None,
+        # Average number of cores kept busy recognizing
+        "busyCores": round(cpu_seconds / wall, 2) if wall else None,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import sys
+import json
+import math
+import time
+import wave
+import random
+import argparse
+from array import array
+
+import audiocodec
+
+RATE = 16000
+BLOCKSIZE = 8000  # Same block size as socket-transmitter.py
+
+
+def synthetic_speech(seconds, rate=RATE):
+    """Speech-like test signal: bursts of modulated tones and noise with pauses."""
+    rng = random.Random(0)
+    samples = array('h')
+    for n in range(int(seconds * rate)):
+        t = n / rate
+        voiced = math.sin(2 * math.pi * 1.5 * t) > -0.3  # ~1.5 syllables/s with gaps
+        if voiced:
+            pitch = 120 + 30 * math.sin(2 * math.pi * 0.5 * t)
+            value = 6000 * math.sin(2 * math.pi * pitch * t) + 2500 * math.sin(2 * math.pi * 3 * pitch * t)
+            value += rng.gauss(0, 800)
+        else:
+            value = rng.gauss(0, 150)
+        samples.append(max(-32768, min(32767, int(value))))
+    return samples.tobytes()
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected mono 16-bit audio")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+def snr_db(reference, decoded):
+    """Signal-to-noise ratio of the decoded audio, in dB."""
+    ref, dec = array('h'), array('h')
+    ref.frombytes(reference)
+    dec.frombytes(decoded[:len(reference)])
+    signal = sum(x * x for x in ref)
+    noise = sum((x - y) * (x - y) for x, y in zip(ref, dec)) or 1
+    return round(10 * math.log10(signal / noise), 1)
+
+
+def bench(name, pcm, rate):
+    codec = audiocodec.get_codec(name)
+    encoder, decoder = codec.encoder(rate), codec.decoder(rate)
+    block_bytes = BLOCKSIZE * 2
+    blocks = [pcm[i:i + block_bytes] for i in range(0, len(pcm), block_bytes)]
+    seconds = len(pcm) / (2 * rate)
+
+    start = time.process_time()
+    encoded = [encoder.encode(block) for block in blocks]
+    encode_cpu = time.process_time() - start
+
+    start = time.process_time()
+    decoded = b"".join(decoder.decode(data) for data in encoded)
+    decode_cpu = time.process_time() - start
+
+    encoded_bytes = sum(len(data) for data in encoded)
+    return {
+        "codec": name,
+        "kbitPerSecond": round(encoded_bytes * 8 / seconds / 1000, 1),
+        "bytesSavedPercent": round(100 * (1 - encoded_bytes / len(pcm)), 1),
+        "encodeCpuMsPerAudioSecond": round(1000 * encode_cpu / seconds, 3),
+        "decodeCpuMsPerAudioSecond": round(1000 * decode_cpu / seconds, 3),
+        "snrDb": snr_db(pcm, decoded) if name != "pcm" else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare uplink codecs: CPU per second of audio against bytes saved."
+    )
+    parser.add_argument("wav", nargs="?", help="Mono 16-bit WAV file (default: synthetic speech)")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of the synthetic signal")
+    parser.add_argument("--codecs", default=",".join(audiocodec.CODECS),
+                        help="Comma-separated codecs to compare")
+    parser.add_argument("--pure-python", action="store_true",
+                        help="Benchmark the pure-Python fallbacks instead of audioop")
+    args = parser.parse_args()
+
+    if args.pure_python:
+        audiocodec.audioop = None
+    if args.wav:
+        pcm, rate = read_wav(args.wav)
+    else:
+        pcm, rate = synthetic_speech(args.seconds), RATE
+
+    results = [bench(name, pcm, rate) for name in args.codecs.split(",")]
+    json.dump({"audioSeconds": len(pcm) / (2 * rate), "rate": rate, "results": results},
+              sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import sys
+import json
+import random
+import argparse
+import statistics
+from array import array
+
+from endpoint import AGGRESSIVENESS, Endpointer
+from engines import FakeEngine
+
+
+def tone(ms, rate, amplitude):
+    """A block of square wave, loud enough to count as speech when amplitude > threshold."""
+    samples = rate * ms // 1000
+    return array('h', (amplitude if (i // 20) % 2 else -amplitude for i in range(samples))).tobytes()
+
+
+def make_script(utterances, words, max_gap_ms, pause_ms, chunk_ms, seed):
+    """
+    Builds a list of (voiced, utterance index) chunks: utterances of spoken
+    words separated by short gaps, with a longer pause after each utterance.
+    """
+    rng = random.Random(seed)
+    script = []
+    for index in range(utterances):
+        for word in range(words):
+            script += [(True, index)] * (300 // chunk_ms)
+            if word < words - 1:
+                script += [(False, index)] * (rng.randrange(1, max_gap_ms // chunk_ms + 1))
+        script += [(False, index)] * (pause_ms // chunk_ms)
+    return script
+
+
+def run(script, aggressiveness, args):
+    """Feeds the script through the stand-in and returns per-utterance pause-to-final latency."""
+    engine = FakeEngine(silence_ms=args.recognizer_silence_ms)
+    stream = engine.open_stream("en", args.rate)
+    endpointer = Endpointer(args.rate, aggressiveness)
+    voiced = tone(args.chunk_ms, args.rate, 3000)
+    silent = bytes(len(voiced))
+
+    # Audio position (ms) where each utterance starts and where its final pause starts
+    starts, pauses = {}, {}
+    finals = []  # (audio position, utterance index)
+    last_voiced = None
+    for position, (is_voiced, index) in enumerate(script):
+        now = (position + 1) * args.chunk_ms
+        starts.setdefault(index, position * args.chunk_ms)
+        if is_voiced:
+            last_voiced = (index, now)
+        elif last_voiced and last_voiced[0] == index:
+            pauses[index] = last_voiced[1]
+
+        pcm = voiced if is_voiced else silent
+        results = stream.accept(pcm)
+        endpointer.audio(pcm)
+        if endpointer.endpoint():
+            # Half-close for the final, then roll over to a fresh stream
+            results += stream.close()
+            stream = engine.open_stream("en", args.rate)
+        for is_final, text in results:
+            if is_final:
+                finals.append((now, index))
+                endpointer.final()
+            else:
+                endpointer.partial(text)
+
+    latencies, splits, missed = [], 0, 0
+    for index, pause in sorted(pauses.items()):
+        split = [t for t, i in finals if i == index and t < pause]
+        after = [t for t, i in finals if i == index and t >= pause]
+        splits += len(split)
+        if after:
+            latencies.append(after[0] - pause)
+        else:
+            missed += 1
+    return {
+        "aggressiveness": aggressiveness,
+        "utterances": len(pauses),
+        "finals": len(finals),
+        "splitFinals": splits,  # finals fired inside an utterance, at a gap between words
+        "missed": missed,
+        "medianMs": statistics.median(latencies) if latencies else None,
+        "maxMs": max(latencies) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure pause-to-final latency with local endpointing, using the recognizer stand-in."
+    )
+    parser.add_argument("--utterances", type=int, default=50)
+    parser.add_argument("--words", type=int, default=6, help="Words per utterance")
+    parser.add_argument("--max-gap-ms", type=int, default=400, help="Longest gap between words")
+    parser.add_argument("--pause-ms", type=int, default=2500, help="Pause after each utterance")
+    parser.add_argument("--recognizer-silence-ms", type=int, default=1200,
+                        help="Silence the stand-in waits for before its own final, like Google")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--rate", type=int, default=16000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    script = make_script(args.utterances, args.words, args.max_gap_ms, args.pause_ms, args.chunk_ms, args.seed)
+    results = [run(script, level, args) for level in sorted(AGGRESSIVENESS)]
+    json.dump({"results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+import argparse
+import logging
+
+import loadgen
+import loops
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare caption fan-out throughput and latency on the asyncio and uvloop event loops."
+    )
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--rate", type=float, default=20, help="Messages published per second")
+    parser.add_argument("--size", type=int, default=100, help="Caption text length")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--client-processes", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--loops", nargs="+", default=loops.available(), choices=("asyncio", "uvloop"))
+    parser.add_argument("--port", type=int, default=18766)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Clients always use the same loop, so only the server's loop differs between runs
+    results = [loadgen.bench("hub", clients, args.rate, args.size, args.seconds, args.port, args.client_processes,
+                             backend=backend, client_backend="auto")
+               for clients in args.clients for backend in args.loops]
+    json.dump({"results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
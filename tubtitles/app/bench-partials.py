@@ -0,0 +1,83 @@
+import sys
+import json
+import time
+import argparse
+
+import audio
+import captions
+import models
+from engines import VoskStream
+
+# Chunk size of the Vosk loop in poc.py (16000 samples at 16 kHz)
+CHUNK_MS = 1000
+
+
+def run(model, feeds, partial_every, changes_only):
+    """Transcribes the corpus once and counts CPU time and emitted messages."""
+    import vosk
+
+    partials = finals = message_bytes = 0
+    texts = []
+    cpu = 0.0
+    for path, rate, chunks in feeds:
+        stream = VoskStream(vosk.KaldiRecognizer(model, rate), partial_every, changes_only)
+        start = time.process_time()
+        for chunk in chunks:
+            for is_final, text in stream.accept(chunk):
+                # Count what would go over the wire for each emitted result
+                message = captions.caption_message(int(is_final), text, "bench", "user", "uuid", "en", 0)
+                message_bytes += len(json.dumps(message))
+                if is_final:
+                    finals += 1
+                    texts.append(text)
+                else:
+                    partials += 1
+        cpu += time.process_time() - start
+    return {
+        "partialEvery": partial_every,
+        "changesOnly": changes_only,
+        "cpuSeconds": round(cpu, 3),
+        "partials": partials,
+        "finals": finals,
+        "messageBytes": message_bytes,
+    }, texts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure CPU and message volume of Vosk partial emission over a WAV corpus."
+    )
+    parser.add_argument("corpus", nargs="+", help="WAV files or directories")
+    models.add_model_arguments(parser)
+    parser.add_argument("--chunk-ms", type=int, default=CHUNK_MS)
+    parser.add_argument("--partial-every", type=int, nargs="+", default=[2, 4],
+                        help="Extra runs evaluating partials only every N chunks")
+    args = parser.parse_args()
+
+    model = models.get_model(models.resolve_from_args(parser, args, interactive=False))
+    feeds = [(path,) + audio.read_wav_chunks(path, args.chunk_ms) for path in audio.find_wavs(args.corpus)]
+    audio_seconds = sum(len(chunk) for _, rate, chunks in feeds for chunk in chunks) / (2 * feeds[0][1])
+
+    # Baseline is the original loop: parse and emit a partial after every chunk
+    configurations = [(1, False), (1, True)] + [(n, True) for n in args.partial_every]
+    results = []
+    baseline_texts = None
+    for partial_every, changes_only in configurations:
+        result, texts = run(model, feeds, partial_every, changes_only)
+        if baseline_texts is None:
+            baseline_texts = texts
+        result["sameFinals"] = texts == baseline_texts
+        results.append(result)
+
+    baseline = results[0]
+    for result in results:
+        result["cpuReductionPercent"] = round(100 * (1 - result["cpuSeconds"] / baseline["cpuSeconds"]), 1)
+        result["messageReductionPercent"] = round(
+            100 * (1 - (result["partials"] + result["finals"]) / (baseline["partials"] + baseline["finals"])), 1
+        )
+    json.dump({"audioSeconds": round(audio_seconds, 1), "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
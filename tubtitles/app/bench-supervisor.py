@@ -0,0 +1,80 @@
+import sys
+import json
+import time
+import argparse
+import statistics
+import threading
+import multiprocessing
+from array import array
+
+from engines import FakeEngine
+from supervisor import Supervisor
+
+
+def recognizer_role(ticks, fault_after_ms, chunk_ms, rate):
+    """Feeds live-paced audio to a stand-in that kills this process after fault_after_ms."""
+    import os
+
+    engine = FakeEngine(fault_after_ms=fault_after_ms, fault="exit")
+    stream = engine.open_stream("en", rate)
+    pcm = array('h', [3000, -3000] * (rate * chunk_ms // 2000)).tobytes()
+    pid = os.getpid()
+    while True:
+        stream.accept(pcm)
+        ticks.put((pid, time.monotonic()))
+        time.sleep(chunk_ms / 1000)
+
+
+def run(method, args):
+    """Runs the role under a supervisor for a while and measures every recovery."""
+    context = multiprocessing.get_context(method)
+    ticks = context.Queue()
+    supervisor = Supervisor(min_backoff=args.min_backoff, context=context, stable_seconds=0)
+    supervisor.add("recognizer", recognizer_role, (ticks, args.fault_after_ms, args.chunk_ms, args.rate))
+    thread = threading.Thread(target=supervisor.run, daemon=True)
+    thread.start()
+
+    # Gap between the last chunk processed by a crashed worker and the first one of its replacement
+    gaps = []
+    last = None
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        try:
+            pid, ts = ticks.get(timeout=0.5)
+        except Exception:
+            continue
+        if last is not None and pid != last[0]:
+            gaps.append((ts - last[1]) * 1000)
+        last = (pid, ts)
+    supervisor.stop()
+    stats = supervisor.stats()["recognizer"]
+    return {
+        "startMethod": method,
+        "restarts": stats["restarts"],
+        "maxSupervisorRecoverMs": stats["maxRecoverMs"],
+        "medianGapMs": round(statistics.median(gaps), 1) if gaps else None,
+        "maxGapMs": round(max(gaps), 1) if gaps else None,
+        "chunkMs": args.chunk_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how fast the supervisor recovers a recognizer role killed by injected faults."
+    )
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fault-after-ms", type=int, default=1000,
+                        help="Audio each worker processes before the stand-in kills it")
+    parser.add_argument("--min-backoff", type=float, default=0.05)
+    parser.add_argument("--chunk-ms", type=int, default=20)
+    parser.add_argument("--rate", type=int, default=16000)
+    parser.add_argument("--methods", nargs="+", default=["fork", "forkserver", "spawn"])
+    args = parser.parse_args()
+
+    results = [run(method, args) for method in args.methods]
+    json.dump({"results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
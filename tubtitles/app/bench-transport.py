@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+
+from transport import (FINAL, PARTIAL, SocketPairTransport, TcpTransport, RfcommTransport,
+                       encode_frame, read_frames)
+
+
+def echo_peer(sock):
+    """
+    Display stand-in: echoes FINAL frames back and silently consumes PARTIAL
+    frames, so the sender can time round trips and detect when a burst landed.
+    """
+    try:
+        for kind, text in read_frames(sock, bufsize=65536):
+            if kind == FINAL:
+                sock.sendall(encode_frame(FINAL, text))
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench(transport, round_trips, burst_frames, frame_size):
+    transport.connect()
+    sock = transport.sock
+    replies = read_frames(sock)
+
+    # Latency: one caption at a time, echoed back by the peer
+    rtts = []
+    for i in range(round_trips):
+        start = time.perf_counter()
+        transport.sendall(encode_frame(FINAL, f"ping {i}"))
+        next(replies)
+        rtts.append(time.perf_counter() - start)
+
+    # Throughput: a burst of partials, then one final to know they all arrived
+    frame = encode_frame(PARTIAL, "x" * frame_size)
+    start = time.perf_counter()
+    for _ in range(burst_frames):
+        transport.sendall(frame)
+    transport.sendall(encode_frame(FINAL, "done"))
+    next(replies)
+    elapsed = time.perf_counter() - start
+    transport.close()
+
+    return {
+        "transport": transport.name,
+        "oneWayLatencyMsP50": round(percentile(rtts, 0.5) * 500, 3),
+        "oneWayLatencyMsP99": round(percentile(rtts, 0.99) * 500, 3),
+        "framesPerSecond": round(burst_frames / elapsed),
+        "megabytesPerSecond": round(burst_frames * len(frame) / elapsed / 1e6, 2),
+    }
+
+
+def socketpair_transport():
+    transport = SocketPairTransport()
+    connect = transport.connect
+
+    def connect_with_peer():
+        connect()
+        threading.Thread(target=echo_peer, args=(transport.peer,), daemon=True).start()
+
+    transport.connect = connect_with_peer
+    return transport
+
+
+def tcp_transport():
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def accept():
+        conn, _ = server.accept()
+        server.close()
+        echo_peer(conn)
+
+    threading.Thread(target=accept, daemon=True).start()
+    return TcpTransport("127.0.0.1", server.getsockname()[1])
+
+
+def serve_rfcomm(port):
+    """Runs the echo peer on this machine's RFCOMM channel, for --rfcomm on the device."""
+    import bluetooth
+
+    server = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+    server.bind(("", port))
+    server.listen(1)
+    print(f"Waiting for a benchmark connection on RFCOMM channel {port}...")
+    while True:
+        conn, address = server.accept()
+        print(f"Benchmark connection from {address}")
+        echo_peer(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure caption latency and throughput per transport.")
+    parser.add_argument("--round-trips", type=int, default=1000)
+    parser.add_argument("--burst-frames", type=int, default=20000)
+    parser.add_argument("--frame-size", type=int, default=64, help="Caption text bytes per frame")
+    parser.add_argument("--rfcomm", metavar="ADDRESS",
+                        help="Also benchmark RFCOMM to a peer running --serve-rfcomm")
+    parser.add_argument("--rfcomm-port", type=int, default=1)
+    parser.add_argument("--serve-rfcomm", action="store_true", help="Run the RFCOMM echo peer")
+    args = parser.parse_args()
+
+    if args.serve_rfcomm:
+        serve_rfcomm(args.rfcomm_port)
+        return
+
+    transports = [socketpair_transport(), tcp_transport()]
+    if args.rfcomm:
+        transports.append(RfcommTransport(args.rfcomm, args.rfcomm_port))
+
+    results = [bench(t, args.round_trips, args.burst_frames, args.frame_size) for t in transports]
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
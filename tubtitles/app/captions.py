@@ -0,0 +1,64 @@
+import json
+import time
+
+# Caption message types
+PARTIAL = 0
+FINAL = 1
+HEALTH = 3
+
+
+def now_ms():
+    """Current wall-clock time in milliseconds, as used in message timestamps."""
+    return int(time.time() * 1000)
+
+
+def caption_message(message_type, transcript, device_id, user_uuid, message_uuid, lang,
+                    start_time, end_time=None, **extra):
+    """
+    Builds a partial (type 0) or final (type 1) caption message. The start/end
+    metadata is appended to the transcript as a JSON object, which is what the
+    displays expect. Extra fields are included as-is.
+    """
+    metadata = {
+        "start_time": start_time,
+        "end_time": end_time
+    }
+    message = {
+        "userId": user_uuid,
+        "type": message_type,
+        "deviceId": device_id,
+        "msg": transcript + json.dumps(metadata),
+        "ts": now_ms(),
+        "uuid": message_uuid,
+        "lang": lang
+    }
+    message.update(extra)
+    return message
+
+
+def health_message(device_id, user_uuid, **extra):
+    """Builds a health check message (type 3). Extra fields are included as-is."""
+    message = {
+        "type": HEALTH,
+        "id": "health",
+        "userId": user_uuid,
+        "uuid": "123",
+        "lang": "en",
+        "isHealthCheck": True,
+        "ts": now_ms(),
+        "msg": " ",
+        "deviceId": device_id
+    }
+    message.update(extra)
+    return message
+
+
+def split_metadata(msg):
+    """Splits a caption "msg" field back into (transcript, metadata dict)."""
+    index = msg.rfind('{"start_time"')
+    if index < 0:
+        return msg, {}
+    try:
+        return msg[:index], json.loads(msg[index:])
+    except json.JSONDecodeError:
+        return msg, {}
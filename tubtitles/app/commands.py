@@ -0,0 +1,76 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Spoken language names and the codes language_receiver_process accepts
+LANGUAGES = {
+    "english": "en",
+    "french": "fr",
+    "spanish": "es",
+    "german": "de",
+    "italian": "it",
+    "portuguese": "pt",
+    "chinese": "zh",
+    "japanese": "ja",
+    "korean": "ko",
+}
+
+LANGUAGE_PREFIXES = ("switch to", "change to", "captions in")
+PAUSE_PHRASES = ("pause captions", "stop captions")
+RESUME_PHRASES = ("resume captions", "start captions")
+
+
+def phrases():
+    """Every phrase the command recognizer can hear."""
+    result = [f"{prefix} {name}" for prefix in LANGUAGE_PREFIXES for name in LANGUAGES]
+    return result + list(PAUSE_PHRASES) + list(RESUME_PHRASES)
+
+
+def grammar():
+    """
+    Vosk grammar: the command phrases plus [unk], so ordinary speech decodes to
+    [unk] instead of being forced onto the closest command.
+    """
+    return phrases() + ["[unk]"]
+
+
+def parse_command(text):
+    """
+    Maps recognized text to a command: ("language", code), ("pause",),
+    ("resume",), or None when the text is not a command.
+    """
+    text = " ".join(text.lower().split())
+    if text in PAUSE_PHRASES:
+        return ("pause",)
+    if text in RESUME_PHRASES:
+        return ("resume",)
+    for prefix in LANGUAGE_PREFIXES:
+        if text.startswith(prefix + " "):
+            code = LANGUAGES.get(text[len(prefix) + 1:])
+            if code is not None:
+                return ("language", code)
+    return None
+
+
+class CommandRecognizer:
+    """
+    Recognizes voice commands with a grammar-restricted Vosk KaldiRecognizer.
+    Decoding against a few dozen phrases is far cheaper than open vocabulary,
+    so it can run next to the main recognition stream on the same device.
+    """
+
+    def __init__(self, model, rate):
+        import vosk
+
+        self._recognizer = vosk.KaldiRecognizer(model, rate, json.dumps(grammar()))
+
+    def accept(self, pcm):
+        """Feeds audio and returns the commands completed by it (usually none)."""
+        if not self._recognizer.AcceptWaveform(pcm):
+            return []
+        text = json.loads(self._recognizer.Result()).get("text", "")
+        command = parse_command(text)
+        if command is not None:
+            logger.info(f"Voice command: {text!r} -> {command}")
+        return [command] if command is not None else []
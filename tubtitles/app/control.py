@@ -0,0 +1,213 @@
+import sys
+import json
+import random
+import asyncio
+import argparse
+import itertools
+import logging
+
+import websockets
+
+import loops
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Devices dial out to the controller on DEVICE_PORT; operators talk to OPERATOR_PORT
+DEVICE_PORT = 8768
+OPERATOR_PORT = 8769
+
+# How long the controller waits for device acks before reporting a timeout
+ACK_TIMEOUT = 5.0
+
+
+class Controller:
+    """
+    Keeps persistent connections to many devices and pushes batched language
+    commands to them. Each device only ever receives the commands addressed to
+    it, and every command is acknowledged so operators get one combined reply.
+    """
+
+    def __init__(self, ack_timeout=ACK_TIMEOUT):
+        self.ack_timeout = ack_timeout
+        self.devices = {}  # device id -> websocket
+        self.state = {}  # device id -> {"lang": ..., "online": ...}
+        self._pending = {}  # (device id, seq) -> future resolved by the ack
+        self._seq = itertools.count(1)
+
+    async def device_handler(self, websocket, path):
+        """Handles one persistent device connection."""
+        try:
+            hello = json.loads(await websocket.recv())
+            device_id = hello["deviceId"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            await websocket.close(code=1008, reason="expected hello with deviceId")
+            return
+        except websockets.exceptions.ConnectionClosed:
+            return
+
+        previous = self.devices.get(device_id)
+        if previous is not None and previous is not websocket:
+            await previous.close(code=1000, reason="replaced by a newer connection")
+        self.devices[device_id] = websocket
+        self.state[device_id] = {"lang": hello.get("lang"), "online": True}
+        logger.info(f"Device {device_id} connected from {websocket.remote_address}")
+
+        try:
+            async for message in websocket:
+                try:
+                    data = json.loads(message)
+                except json.JSONDecodeError:
+                    logger.error(f"Invalid JSON from device {device_id}: {message}")
+                    continue
+                if not isinstance(data, dict):
+                    logger.error(f"Expected a JSON object from device {device_id}: {message}")
+                    continue
+                if data.get("lang") is not None:
+                    self.state[device_id]["lang"] = data["lang"]
+                future = self._pending.pop((device_id, data.get("seq")), None)
+                if future is not None and not future.done():
+                    future.set_result(data)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if self.devices.get(device_id) is websocket:
+                del self.devices[device_id]
+                self.state[device_id]["online"] = False
+                logger.info(f"Device {device_id} disconnected")
+
+    async def _send_command(self, device_id, lang):
+        """Sends one command to one device and waits for its ack."""
+        websocket = self.devices.get(device_id)
+        if websocket is None:
+            return {"ok": False, "error": "offline"}
+
+        seq = next(self._seq)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(device_id, seq)] = future
+        try:
+            await websocket.send(json.dumps({"op": "set", "seq": seq, "lang": lang}))
+            ack = await asyncio.wait_for(future, self.ack_timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": "timeout"}
+        except websockets.exceptions.ConnectionClosed:
+            return {"ok": False, "error": "offline"}
+        finally:
+            self._pending.pop((device_id, seq), None)
+        return {"ok": bool(ack.get("ok")), "lang": ack.get("lang"), "error": ack.get("error")}
+
+    async def apply(self, langs):
+        """Pushes a {device_id: lang} batch to all devices concurrently."""
+        device_ids = list(langs)
+        results = await asyncio.gather(
+            *(self._send_command(device_id, langs[device_id]) for device_id in device_ids)
+        )
+        return dict(zip(device_ids, results))
+
+    def _expand(self, data):
+        """Turns an operator request into a {device_id: lang} batch."""
+        if "langs" in data:
+            return dict(data["langs"])
+        devices = data.get("devices", "*")
+        if devices == "*":
+            devices = list(self.devices)
+        elif not isinstance(devices, list):
+            # A bare string would otherwise be taken one character at a time
+            raise ValueError(f'devices must be a list of device ids or "*", not {devices!r}')
+        return {device_id: data["lang"] for device_id in devices}
+
+    async def operator_handler(self, websocket, path):
+        """Handles operator requests: batched set commands and state queries."""
+        async for message in websocket:
+            try:
+                data = json.loads(message)
+                if not isinstance(data, dict):
+                    raise ValueError("expected a JSON object")
+                op = data.get("op")
+                if op is None:
+                    # Legacy 8767 format: a bare {device_id: lang} map
+                    data = {"op": "set", "langs": data}
+                    op = "set"
+
+                if op == "set":
+                    results = await self.apply(self._expand(data))
+                    reply = {"op": "result", "id": data.get("id"), "results": results}
+                elif op == "state":
+                    reply = {"op": "state", "id": data.get("id"), "devices": self.state}
+                else:
+                    reply = {"op": "error", "id": data.get("id"), "error": f"unknown op {op}"}
+            except (json.JSONDecodeError, ValueError, KeyError, TypeError) as e:
+                reply = {"op": "error", "error": f"bad request: {e}"}
+            await websocket.send(json.dumps(reply))
+
+
+async def device_agent(url, device_id, apply_language, current_language, max_backoff=30.0):
+    """
+    Device side of the control plane. Keeps a persistent connection to the
+    controller, applies the commands addressed to this device and acks them.
+    Reconnects with jittered exponential backoff.
+
+    apply_language(lang) returns (ok, error); current_language() returns the
+    language the device is currently captioning in.
+    """
+    backoff = 0.5
+    while True:
+        try:
+            async with websockets.connect(url) as websocket:
+                await websocket.send(json.dumps(
+                    {"op": "hello", "deviceId": device_id, "lang": current_language()}
+                ))
+                logger.info(f"Connected to controller at {url}")
+                backoff = 0.5
+                async for message in websocket:
+                    try:
+                        data = json.loads(message)
+                    except json.JSONDecodeError:
+                        logger.error(f"Invalid JSON from controller: {message}")
+                        continue
+                    if not isinstance(data, dict):
+                        logger.error(f"Expected a JSON object from controller: {message}")
+                        continue
+                    if data.get("op") == "set":
+                        ok, error = apply_language(data.get("lang"))
+                    else:
+                        ok, error = False, f"unknown op {data.get('op')}"
+                    await websocket.send(json.dumps({
+                        "op": "ack",
+                        "seq": data.get("seq"),
+                        "ok": ok,
+                        "error": error,
+                        "lang": current_language(),
+                    }))
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            logger.warning(f"Controller connection lost ({e}); retrying in {backoff:.1f}s")
+        await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+        backoff = min(backoff * 2, max_backoff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Language control service for many devices.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--device-port", type=int, default=DEVICE_PORT)
+    parser.add_argument("--operator-port", type=int, default=OPERATOR_PORT)
+    parser.add_argument("--ack-timeout", type=float, default=ACK_TIMEOUT)
+    parser.add_argument("--loop", choices=loops.BACKENDS, help="Event loop (default: $TUB_LOOP or auto)")
+    args = parser.parse_args()
+
+    controller = Controller(ack_timeout=args.ack_timeout)
+
+    async def serve():
+        await websockets.serve(controller.device_handler, args.host, args.device_port)
+        await websockets.serve(controller.operator_handler, args.host, args.operator_port)
+        logger.info(f"Controller listening for devices on {args.device_port}, operators on {args.operator_port}")
+        await asyncio.Future()  # Serve forever
+
+    loops.run(serve(), args.loop)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
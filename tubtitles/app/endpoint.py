@@ -0,0 +1,72 @@
+import logging
+
+import audio
+
+logger = logging.getLogger(__name__)
+
+# Aggressiveness -> (trailing silence ms, partial unchanged ms) before an endpoint.
+# 0 leaves endpointing to the recognizer.
+AGGRESSIVENESS = {
+    0: None,
+    1: (900, 600),
+    2: (600, 400),
+    3: (350, 250),
+}
+
+
+class Endpointer:
+    """
+    Local end-of-utterance detector. An utterance is over when the audio has
+    been quiet for a while and the recognizer's partial has stopped changing;
+    the caller then half-closes (or rolls) the recognition stream so the final
+    arrives without waiting for the recognizer's own, slower endpointing.
+
+    Time is counted in audio fed, not wall time, so results are reproducible
+    on recorded audio.
+    """
+
+    def __init__(self, rate, aggressiveness=2, threshold=500):
+        if aggressiveness not in AGGRESSIVENESS:
+            raise ValueError(f"Aggressiveness must be one of {sorted(AGGRESSIVENESS)}")
+        self.rate = rate
+        self.aggressiveness = aggressiveness
+        self.threshold = threshold
+        self.endpoints = 0
+        self.reset()
+
+    def reset(self):
+        """Forgets the current utterance, e.g. when a new stream starts."""
+        self._partial = None
+        self._silent_ms = 0.0
+        self._stable_ms = 0.0
+
+    def audio(self, pcm):
+        """Feeds the audio sent to the recognizer."""
+        block_ms = audio.duration(pcm, self.rate) * 1000
+        if audio.rms(pcm) >= self.threshold:
+            self._silent_ms = 0.0
+        else:
+            self._silent_ms += block_ms
+        self._stable_ms += block_ms
+
+    def partial(self, text):
+        """Feeds a partial result from the recognizer."""
+        if text != self._partial:
+            self._partial = text
+            self._stable_ms = 0.0
+
+    def final(self):
+        """Feeds a final result; the utterance ended on its own."""
+        self.reset()
+
+    def endpoint(self):
+        """True once per utterance, when the stream should be closed for a final."""
+        limits = AGGRESSIVENESS[self.aggressiveness]
+        if limits is None or not self._partial:
+            return False
+        silence_ms, stable_ms = limits
+        if self._silent_ms >= silence_ms and self._stable_ms >= stable_ms:
+            self.endpoints += 1
+            self.reset()
+            return True
+        return False
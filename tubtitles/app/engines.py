@@ -0,0 +1,287 @@
+"""
+Speech recognition engines share one small interface so the ingest server,
+batch tools and benchmarks can swap them freely:
+
+    engine = create_engine("vosk", model_path="../lang/models/...")
+    stream = engine.open_stream(lang, rate)
+    results = stream.accept(pcm)   # list of (is_final, transcript)
+    results = stream.close()       # flushes any pending final
+
+accept() is called from one worker thread at a time per stream, but different
+streams may be fed from different threads concurrently.
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+
+import audio
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleStream:
+    """
+    Google streaming recognition fed from accept() calls. Google ends a
+    streaming call after about 305 s, so the call is half-closed and reopened
+    every ROLL_SECONDS; audio arriving meanwhile waits in the queue. If a call
+    fails, the next accept() raises, so the caller's error handling runs
+    instead of audio piling up unrecognized.
+    """
+
+    ROLL_SECONDS = 290
+
+    def __init__(self, client, streaming_config, speech):
+        self._speech = speech
+        self._audio = queue.Queue()
+        self._results = queue.Queue()
+        self._closing = False
+        self.error = None
+        self.rolls = 0
+        self._thread = threading.Thread(
+            target=self._run, args=(client, streaming_config), daemon=True
+        )
+        self._thread.start()
+
+    def _requests(self, deadline):
+        while True:
+            # Checked before every get: with continuous audio the get never times out
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return  # Time to roll over to a new call
+            try:
+                data = self._audio.get(timeout=remaining)
+            except queue.Empty:
+                return
+            if data is None:
+                self._closing = True
+                return
+            yield self._speech.StreamingRecognizeRequest(audio_content=data)
+
+    def _run(self, client, streaming_config):
+        try:
+            while not self._closing:
+                deadline = time.monotonic() + self.ROLL_SECONDS
+                for response in client.streaming_recognize(streaming_config, self._requests(deadline)):
+                    if not response.results:
+                        continue
+                    result = response.results[0]
+                    if not result.alternatives:
+                        continue
+                    self._results.put((result.is_final, result.alternatives[0].transcript))
+                if not self._closing:
+                    self.rolls += 1
+        except Exception as e:
+            logger.error(f"Exception in Google stream: {e}")
+            self.error = e
+
+    def _drain(self):
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def accept(self, pcm):
+        if not self._thread.is_alive():
+            results = self._drain()
+            if results:
+                return results  # Hand over what was recognized before failing first
+            raise RuntimeError(f"Google stream stopped: {self.error}")
+        self._audio.put(pcm)
+        return self._drain()
+
+    def close(self):
+        # Half-close the request stream so Google returns its last final
+        self._audio.put(None)
+        self._thread.join(timeout=5)
+        return self._drain()
+
+
+class GoogleEngine:
+    """Google Cloud Speech streaming recognition."""
+
+    name = "google"
+
+    def __init__(self, key_path="key.txt"):
+        from google.cloud import speech
+        from google.oauth2 import service_account
+
+        self._speech = speech
+        credentials = service_account.Credentials.from_service_account_file(key_path)
+        self._client = speech.SpeechClient(credentials=credentials)
+
+    def open_stream(self, lang, rate):
+        speech = self._speech
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=rate,
+            language_code=lang,
+        )
+        streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=True)
+        return GoogleStream(self._client, streaming_config, speech)
+
+
+class VoskStream:
+    """
+    A Vosk KaldiRecognizer fed from accept() calls.
+
+    Partials are only emitted when their text changes, which skips most chunks
+    during pauses; the raw JSON is compared before parsing it. With
+    partial_every=N the partial is only evaluated on every Nth non-final chunk.
+    changes_only=False restores one partial per chunk, for comparison.
+    """
+
+    def __init__(self, recognizer, partial_every=1, changes_only=True):
+        self._recognizer = recognizer
+        self._partial_every = partial_every
+        self._changes_only = changes_only
+        self._since_partial = 0
+        self._last_partial = None
+        self.partials_skipped = 0
+
+    def accept(self, pcm):
+        if self._recognizer.AcceptWaveform(pcm):
+            self._since_partial = 0
+            self._last_partial = None
+            return [(True, json.loads(self._recognizer.Result())['text'])]
+
+        self._since_partial += 1
+        if self._since_partial < self._partial_every:
+            self.partials_skipped += 1
+            return []
+        self._since_partial = 0
+
+        raw = self._recognizer.PartialResult()
+        if self._changes_only:
+            if raw == self._last_partial:
+                self.partials_skipped += 1
+                return []
+            self._last_partial = raw
+        text = json.loads(raw)['partial']
+        if self._changes_only and not text:
+            return []
+        return [(False, text)]
+
+    def close(self):
+        text = json.loads(self._recognizer.FinalResult())['text']
+        return [(True, text)] if text else []
+
+
+class VoskEngine:
+    """Local Vosk recognition. All streams share one loaded model."""
+
+    name = "vosk"
+
+    def __init__(self, model_path, partial_every=1, changes_only=True):
+        import vosk
+
+        self._vosk = vosk
+        # Loaded once per process and shared with any other engine on the same model
+        self.model = models.get_model(model_path)
+        self.partial_every = partial_every
+        self.changes_only = changes_only
+
+    def open_stream(self, lang, rate):
+        # Vosk models are single-language, so lang is fixed by the model
+        recognizer = self._vosk.KaldiRecognizer(self.model, rate)
+        return VoskStream(recognizer, self.partial_every, self.changes_only)
+
+
+class FakeStream:
+    """
+    Recognizer stand-in. Emits one word per `word_ms` of audio louder than
+    `threshold`, a growing partial after every block, and a final after
+    `silence_ms` of quiet audio.
+
+    With `fault_after_ms`, it fails once that much audio has been fed: by
+    raising RuntimeError ("raise"), or by killing its process ("exit"), to
+    exercise error handling and supervision.
+    """
+
+    def __init__(self, rate, word_ms, silence_ms, threshold, delay, fault_after_ms=None, fault="raise"):
+        self._rate = rate
+        self._word_ms = word_ms
+        self._silence_ms = silence_ms
+        self._threshold = threshold
+        self._delay = delay
+        self._words = []
+        self._voiced_ms = 0.0
+        self._silent_ms = 0.0
+        self._fault_after_ms = fault_after_ms
+        self._fault = fault
+        self._fed_ms = 0.0
+
+    def accept(self, pcm):
+        block_ms = audio.duration(pcm, self._rate) * 1000
+        self._fed_ms += block_ms
+        if self._fault_after_ms is not None and self._fed_ms > self._fault_after_ms:
+            if self._fault == "exit":
+                logger.error("Injected fault: exiting")
+                os._exit(1)
+            raise RuntimeError("Injected fault")
+        if self._delay:
+            # Simulate decoding cost proportional to the audio length
+            time.sleep(self._delay * block_ms / 1000)
+
+        if audio.rms(pcm) >= self._threshold:
+            self._silent_ms = 0.0
+            self._voiced_ms += block_ms
+            changed = False
+            while self._voiced_ms >= self._word_ms:
+                self._voiced_ms -= self._word_ms
+                self._words.append(f"word{len(self._words) + 1}")
+                changed = True
+            # Like VoskStream, partials are only emitted when they change
+            return [(False, " ".join(self._words))] if changed else []
+
+        self._silent_ms += block_ms
+        if self._words and self._silent_ms >= self._silence_ms:
+            return self.close()
+        return []
+
+    def close(self):
+        text = " ".join(self._words)
+        self._words = []
+        self._voiced_ms = 0.0
+        return [(True, text)] if text else []
+
+
+class FakeEngine:
+    """Deterministic recognizer stand-in for tests and benchmarks."""
+
+    name = "fake"
+
+    def __init__(self, word_ms=300, silence_ms=700, threshold=500, delay=0.0, fault_after_ms=None, fault="raise"):
+        if fault not in ("raise", "exit"):
+            raise ValueError(f"Unknown fault {fault}; expected raise or exit")
+        self.word_ms = word_ms
+        self.silence_ms = silence_ms
+        self.threshold = threshold
+        self.delay = delay
+        self.fault_after_ms = fault_after_ms
+        self.fault = fault
+
+    def open_stream(self, lang, rate):
+        return FakeStream(rate, self.word_ms, self.silence_ms, self.threshold, self.delay,
+                          self.fault_after_ms, self.fault)
+
+
+ENGINES = {
+    "google": GoogleEngine,
+    "vosk": VoskEngine,
+    "fake": FakeEngine,
+}
+
+
+def create_engine(name, **options):
+    """Creates a recognition engine by name with engine-specific options."""
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown engine {name}; expected one of {sorted(ENGINES)}")
+    return engine_class(**options)
@@ -0,0 +1,93 @@
+import os
+import json
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Unix socket where a running ICHY offers its listening sockets to its successor
+HANDOFF_PATH = "ichy-handoff.sock"
+
+
+def listen(port, host="0.0.0.0", reuse_port=False):
+    """
+    Creates a TCP listening socket that can be shared with child processes.
+    With reuse_port, several such sockets can listen on one port and the
+    kernel spreads new connections over them.
+    """
+    sock = socket.create_server((host, port), reuse_port=reuse_port)
+    sock.set_inheritable(True)
+    return sock
+
+
+def receive(path=HANDOFF_PATH, timeout=10):
+    """
+    Asks the process serving `path` for its listening sockets. Returns
+    (sockets, state): a dict name -> socket and the state the old process
+    passed along, or ({}, {}) when no process is serving (first start). The old
+    process stops accepting once this returns; it keeps its open connections
+    until they are drained.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return {}, {}
+    with client:
+        message, fds, _, _ = socket.recv_fds(client, 4096, 16)
+        message = json.loads(message)
+        names = message["names"]
+        sockets = {name: socket.socket(fileno=fd) for name, fd in zip(names, fds)}
+        for sock in sockets.values():
+            sock.set_inheritable(True)
+        # Tell the old process it may let go of the handoff path, then wait until it has
+        client.sendall(b"ok")
+        client.recv(1)
+    logger.info(f"Took over listening sockets {names} from process {message['pid']}")
+    return sockets, message["state"]
+
+
+class HandoffServer:
+    """
+    Serves listening sockets to a successor process over a unix socket with
+    SCM_RIGHTS, so a new version can take over the ports without a moment in
+    which connections are refused. `state()` supplies a JSON-able dict sent
+    along with them. `on_handoff` is called once they are sent; the caller then
+    stops accepting and drains its existing connections.
+    """
+
+    def __init__(self, sockets, state, on_handoff, path=HANDOFF_PATH):
+        self.sockets = sockets
+        self.state = state
+        self.on_handoff = on_handoff
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)  # Left over by a process that did not exit cleanly
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(1)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            connection, _ = self._server.accept()
+            with connection:
+                try:
+                    names = list(self.sockets)
+                    message = json.dumps({"names": names, "pid": os.getpid(), "state": self.state()}).encode()
+                    socket.send_fds(connection, [message], [self.sockets[name].fileno() for name in names])
+                    if connection.recv(2) != b"ok":
+                        continue
+                except OSError as e:
+                    logger.error(f"Handoff failed: {e}")
+                    continue
+                # Release the path before the successor binds it for the next upgrade
+                self._server.close()
+                os.unlink(self.path)
+            logger.info(f"Handed sockets {names} over to the new process")
+            self.on_handoff()
+            return
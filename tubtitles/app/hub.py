@@ -0,0 +1,170 @@
+import json
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# Message types as they appear in the "type" field of caption messages
+TYPE_TOPICS = {
+    0: "partials",
+    1: "finals",
+    3: "health",
+}
+TOPIC_TYPES = {name: type_id for type_id, name in TYPE_TOPICS.items()}
+
+# Topic dimensions a subscriber can filter on, keyed by query parameter
+DIMENSIONS = ("devices", "langs", "types")
+
+
+def parse_topics(path):
+    """
+    Parses the topics a subscriber declares in its connection URL, e.g.
+    ws://host:8766/?devices=cuke,carrot&langs=en,fr&types=finals,health
+
+    Returns a dict mapping each dimension to a set of values, or None when the
+    subscriber did not restrict that dimension (i.e. wants everything).
+    """
+    query = parse_qs(urlsplit(path or "").query)
+    topics = {}
+    for dimension in DIMENSIONS:
+        values = set()
+        for raw in query.get(dimension, []):
+            values.update(v.strip() for v in raw.split(",") if v.strip())
+        topics[dimension] = values or None
+
+    if topics["types"] is not None:
+        types = set()
+        for name in topics["types"]:
+            if name in TOPIC_TYPES:
+                types.add(TOPIC_TYPES[name])
+            elif name.isdigit():
+                types.add(int(name))
+            else:
+                raise ValueError(f"Unknown message type: {name}")
+        topics["types"] = types
+    return topics
+
+
+def message_topic(message):
+    """Returns the (deviceId, lang, type) topic of a caption message."""
+    message_type = message.get("type")
+    # Health checks are not language specific, so they reach every language filter
+    lang = None if message_type == 3 else message.get("lang")
+    return message.get("deviceId"), lang, message_type
+
+
+class Hub:
+    """
+    Keeps an index from topic to subscriber set and fans each message out to the
+    interested sockets only. A message is serialized once no matter how many
+    subscribers receive it.
+
+    `on_change`, if given, is called with the subscriber count after every
+    subscribe and unsubscribe.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.topics = {}
+        # dimension -> value -> subscribers that asked for that value
+        self._index = {dimension: {} for dimension in DIMENSIONS}
+        # dimension -> subscribers that did not restrict that dimension
+        self._wildcard = {dimension: set() for dimension in DIMENSIONS}
+        # (deviceId, lang, type) -> subscribers, rebuilt lazily after (un)subscribes
+        self._matches = {}
+        self.published = 0
+        self.delivered = 0
+
+    def __len__(self):
+        return len(self.topics)
+
+    def subscribe(self, websocket, topics):
+        """Registers a subscriber for the given topics (see parse_topics)."""
+        self.unsubscribe(websocket)
+        self.topics[websocket] = topics
+        for dimension in DIMENSIONS:
+            values = topics.get(dimension)
+            if values is None:
+                self._wildcard[dimension].add(websocket)
+            else:
+                for value in values:
+                    self._index[dimension].setdefault(value, set()).add(websocket)
+        self._matches.clear()
+        if self.on_change is not None:
+            self.on_change(len(self.topics))
+
+    def unsubscribe(self, websocket):
+        """Removes a subscriber from every topic it was registered for."""
+        topics = self.topics.pop(websocket, None)
+        if topics is None:
+            return
+        for dimension in DIMENSIONS:
+            values = topics.get(dimension)
+            if values is None:
+                self._wildcard[dimension].discard(websocket)
+                continue
+            index = self._index[dimension]
+            for value in values:
+                subscribers = index.get(value)
+                if subscribers is not None:
+                    subscribers.discard(websocket)
+                    if not subscribers:
+                        del index[value]
+        self._matches.clear()
+        if self.on_change is not None:
+            self.on_change(len(self.topics))
+
+    def match(self, device_id, lang, message_type):
+        """Returns the subscribers interested in a (deviceId, lang, type) topic."""
+        key = (device_id, lang, message_type)
+        matched = self._matches.get(key)
+        if matched is not None:
+            return matched
+
+        matched = None
+        for dimension, value in zip(DIMENSIONS, key):
+            if value is None:
+                continue
+            candidates = self._index[dimension].get(value, set()) | self._wildcard[dimension]
+            matched = candidates if matched is None else matched & candidates
+            if not matched:
+                break
+        if matched is None:
+            matched = set(self.topics)
+
+        self._matches[key] = matched
+        return matched
+
+    def publish(self, message, data=None):
+        """
+        Serializes a caption message once and sends it to its subscribers. Pass
+        `data` when the message is already serialized, e.g. read from a feed.
+        """
+        subscribers = self.match(*message_topic(message))
+        self.published += 1
+        if not subscribers:
+            return 0
+        if data is None:
+            data = json.dumps(message)
+        websockets.broadcast(subscribers, data)
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    async def handler(self, websocket, path):
+        """WebSocket handler that registers a subscriber until it disconnects."""
+        try:
+            topics = parse_topics(path)
+        except ValueError as e:
+            logger.warning(f"Rejected subscriber {websocket.remote_address}: {e}")
+            await websocket.close(code=1008, reason=str(e))
+            return
+
+        self.subscribe(websocket, topics)
+        logger.info(f"Subscriber {websocket.remote_address} connected with topics {topics}")
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.unsubscribe(websocket)
+            logger.info(f"Subscriber {websocket.remote_address} disconnected")
@@ -0,0 +1,109 @@
+import time
+import logging
+from collections import deque
+
+import audio
+
+logger = logging.getLogger(__name__)
+
+
+class IdlePolicy:
+    """
+    Decides when the upstream recognition stream is worth keeping open. The
+    stream is suspended after `silence_seconds` without speech, or as soon as
+    no subscriber is connected (when subscriber counts are known), and resumed
+    when both speech and a subscriber are present again.
+
+    While suspended, the last `preroll_ms` of audio is kept so the words that
+    triggered the resume are sent first on the new stream. The time from the
+    triggering chunk to the first request on the new stream is the resume
+    latency, and it is checked against `resume_budget_ms`.
+    """
+
+    def __init__(self, rate, chunk_ms, silence_seconds=30, threshold=500,
+                 preroll_ms=1500, resume_budget_ms=500, require_subscribers=True):
+        self.silence_seconds = silence_seconds
+        self.threshold = threshold
+        self.resume_budget_ms = resume_budget_ms
+        self.require_subscribers = require_subscribers
+        self.preroll = deque(maxlen=max(1, preroll_ms // chunk_ms))
+        self.last_speech = time.monotonic()
+        self.subscribers = None
+        self.suspended_since = None
+        self.trigger = None
+        self.suspensions = 0
+        self.suspended_seconds = 0.0
+        self.last_resume_ms = None
+        self.max_resume_ms = 0.0
+        self.over_budget = 0
+
+    @property
+    def suspended(self):
+        return self.suspended_since is not None
+
+    def _wanted(self, now):
+        if self.require_subscribers and self.subscribers == 0:
+            return False, "no subscribers"
+        if now - self.last_speech > self.silence_seconds:
+            return False, "silence"
+        return True, None
+
+    def observe(self, pcm, subscribers=None):
+        """
+        Feeds one microphone chunk and the current subscriber count (None when
+        unknown). Returns True while the stream should be open.
+        """
+        now = time.monotonic()
+        if audio.rms(pcm) >= self.threshold:
+            self.last_speech = now
+        if subscribers is not None:
+            self.subscribers = subscribers
+        wanted, reason = self._wanted(now)
+        if self.suspended_since is None:
+            if not wanted:
+                self.suspended_since = now
+                self.suspensions += 1
+                self.preroll.clear()
+                logger.info(f"Suspending recognition stream: {reason}")
+            return wanted
+        self.preroll.append(pcm)
+        if wanted and self.trigger is None:
+            self.trigger = now
+        return wanted
+
+    def take_preroll(self):
+        """Returns and clears the buffered audio to replay on the resumed stream."""
+        chunks = list(self.preroll)
+        self.preroll.clear()
+        return chunks
+
+    def resumed(self):
+        """Call when the first request goes out on the resumed stream."""
+        if self.suspended_since is None:
+            return
+        now = time.monotonic()
+        self.suspended_seconds += now - self.suspended_since
+        self.suspended_since = None
+        if self.trigger is not None:
+            latency = (now - self.trigger) * 1000
+            self.trigger = None
+            self.last_resume_ms = round(latency, 1)
+            self.max_resume_ms = max(self.max_resume_ms, self.last_resume_ms)
+            if latency > self.resume_budget_ms:
+                self.over_budget += 1
+                logger.warning(f"Resume took {latency:.0f} ms, over the {self.resume_budget_ms} ms budget")
+            else:
+                logger.info(f"Recognition stream resumed in {latency:.0f} ms")
+
+    def stats(self):
+        suspended = self.suspended_seconds
+        if self.suspended_since is not None:
+            suspended += time.monotonic() - self.suspended_since
+        return {
+            "suspended": self.suspended_since is not None,
+            "suspensions": self.suspensions,
+            "suspendedSeconds": round(suspended, 1),
+            "lastResumeMs": self.last_resume_ms,
+            "maxResumeMs": self.max_resume_ms,
+            "resumesOverBudget": self.over_budget,
+        }
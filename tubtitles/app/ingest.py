@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+import websockets
+
+import audiocodec
+import captions
+import loops
+import models
+from engines import create_engine
+from hub import Hub
+from streampool import StreamPool
+from uplink import TAG, CATCHUP
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Defaults matching socket-transmitter.py
+INGEST_PORT = 8765
+PUBLISH_PORT = 8766
+RATE = 16000
+LANG = "en"
+
+# Seconds between health messages / stats log lines
+HEALTH_INTERVAL = 9
+
+
+class Session:
+    """Caption state for one device's audio stream."""
+
+    def __init__(self, device_id, lang, rate, catchup=False, codec="pcm"):
+        self.device_id = device_id
+        self.lang = lang
+        self.rate = rate
+        self.codec = codec
+        self.catchup = catchup  # audio spooled on the device during an outage
+        self.user_uuid = str(uuid.uuid4())
+        self.message_uuid = str(uuid.uuid4())
+        self.start_time = None
+
+
+class IngestServer:
+    """
+    Accepts audio streams from many devices, recognizes each one on a bounded
+    worker pool and publishes the captions through a Hub with the same message
+    schema ICHY uses.
+    """
+
+    def __init__(self, engine, workers, quantum=4, max_pending=100):
+        self.engine = engine
+        self.hub = Hub()
+        self.pool = StreamPool(workers, self._on_results, quantum=quantum, max_pending=max_pending)
+        self._loop = None
+
+    def _on_results(self, stream, results):
+        # Called from a worker thread; publishing happens on the event loop
+        self._loop.call_soon_threadsafe(self._publish, stream.session, results, stream.capture_ts)
+
+    def _publish(self, session, results, capture_ts=None):
+        # Catch-up audio is from the past, so its captions are timed by capture time
+        now = capture_ts if session.catchup and capture_ts else captions.now_ms()
+        extra = {"catchup": True} if session.catchup else {}
+        for is_final, transcript in results:
+            if not transcript:
+                continue
+            if session.start_time is None:
+                session.start_time = now
+            if is_final:
+                message = captions.caption_message(
+                    captions.FINAL, transcript, session.device_id, session.user_uuid,
+                    session.message_uuid, session.lang, session.start_time, now, **extra
+                )
+                session.start_time = None
+                session.message_uuid = str(uuid.uuid4())
+            elif session.catchup:
+                # Nobody is waiting on partials for audio that is minutes old
+                continue
+            else:
+                message = captions.caption_message(
+                    captions.PARTIAL, transcript, session.device_id, session.user_uuid,
+                    session.message_uuid, session.lang, session.start_time
+                )
+            self.hub.publish(message)
+
+    def _open(self, session, key):
+        recognizer = self.engine.open_stream(session.lang, session.rate)
+        decoder = None
+        if session.codec != "pcm":
+            decoder = audiocodec.get_codec(session.codec).decoder(session.rate)
+        stream = self.pool.open(key, recognizer, session.rate, decoder)
+        stream.session = session
+        return stream
+
+    async def handler(self, websocket, path):
+        """
+        Receives one device's audio. An optional first text message is a
+        handshake: {"deviceId": ..., "lang": ..., "rate": ..., "framing": ...,
+        "codecs": [...]}; the reply names the codec picked for the audio.
+        Clients that send audio straight away (like the original
+        socket-transmitter.py) may pass the same fields in the URL query string.
+
+        With "framing": "tagged" every binary message starts with uplink.TAG,
+        and catch-up audio from the device's spool is recognized on a separate
+        stream so it never mixes with live audio.
+        """
+        query = {k: v[0] for k, v in parse_qs(urlsplit(path or "").query).items()}
+        host, port = websocket.remote_address[:2]
+        device_id = query.get("deviceId", f"{host}:{port}")
+        lang = query.get("lang", LANG)
+        framing = query.get("framing", "raw")
+        codec = "pcm"
+        try:
+            rate = int(query.get("rate", RATE))
+        except ValueError as e:
+            await websocket.close(code=1008, reason=f"bad handshake: {e}")
+            return
+
+        try:
+            first = await websocket.recv()
+        except websockets.exceptions.ConnectionClosed:
+            return
+        if isinstance(first, str):
+            try:
+                hello = json.loads(first)
+                device_id = hello.get("deviceId", device_id)
+                lang = hello.get("lang", lang)
+                rate = int(hello.get("rate", rate))
+                framing = hello.get("framing", framing)
+                codecs = hello.get("codecs")
+                if codecs is not None and not isinstance(codecs, list):
+                    raise ValueError(f"codecs must be a list, not {codecs!r}")
+                codec = audiocodec.negotiate(codecs)
+            except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+                await websocket.close(code=1008, reason=f"bad handshake: {e}")
+                return
+            await websocket.send(json.dumps(
+                {"op": "ready", "deviceId": device_id, "lang": lang, "rate": rate, "codec": codec}
+            ))
+            first = None
+
+        key = (device_id, websocket.id)
+        session = Session(device_id, lang, rate, codec=codec)
+        stream = self._open(session, key)
+        catchup_stream = None
+        logger.info(f"Device {device_id} streaming ({lang}, {rate} Hz, {framing}, {codec}) from {host}:{port}")
+
+        def feed(message):
+            nonlocal catchup_stream
+            if framing != "tagged":
+                self.pool.feed(stream, message)
+                return
+            if len(message) < TAG.size:
+                logger.error(f"Tagged frame of {len(message)} bytes from device {device_id}; ignoring it")
+                return
+            channel, ts = TAG.unpack_from(message)
+            if channel != CATCHUP:
+                self.pool.feed(stream, message[TAG.size:], ts)
+                return
+            if catchup_stream is None or catchup_stream.closed:
+                catchup_session = Session(device_id, session.lang, rate, catchup=True, codec=codec)
+                catchup_stream = self._open(catchup_session, key + ("catchup",))
+                logger.info(f"Device {device_id} is uploading spooled audio")
+            self.pool.feed(catchup_stream, message[TAG.size:], ts)
+
+        if first is not None:
+            feed(first)
+
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    feed(message)
+                    continue
+                try:
+                    data = json.loads(message)
+                except json.JSONDecodeError:
+                    logger.error(f"Invalid JSON from device {device_id}: {message}")
+                    continue
+                if not isinstance(data, dict):
+                    logger.error(f"Expected a JSON object from device {device_id}: {message}")
+                    continue
+                if data.get("op") == "lang" and data.get("lang") != session.lang:
+                    if not isinstance(data.get("lang"), str):
+                        logger.error(f"Invalid language from device {device_id}: {message}")
+                        continue
+                    # Finish the current recognizer, then continue in the new language
+                    session = Session(device_id, data["lang"], rate, codec=codec)
+                    recognizer = self.engine.open_stream(session.lang, rate)
+                    self.pool.switch(stream, recognizer, session=session)
+                    if catchup_stream is not None:
+                        # Catch-up audio reopens its stream in the new language on its next frame
+                        self.pool.close(catchup_stream)
+                        catchup_stream = None
+                    logger.info(f"Device {device_id} switched to {session.lang}")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.pool.close(stream)
+            if catchup_stream is not None:
+                self.pool.close(catchup_stream)
+            logger.info(f"Device {device_id} disconnected: {stream.stats()}")
+
+    async def report_health(self):
+        """Publishes a health message with lag stats for every stream."""
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            for stream in list(self.pool.streams.values()):
+                stats = stream.stats()
+                session = stream.session
+                self.hub.publish(captions.health_message(session.device_id, session.user_uuid, **stats))
+                logger.info(f"Stream {session.device_id}: {stats}")
+
+    async def serve(self, host, ingest_port, publish_port):
+        self._loop = asyncio.get_running_loop()
+        # Audio arrives as many small frames; compression would only cost CPU
+        await websockets.serve(self.handler, host, ingest_port, compression=None)
+        await websockets.serve(self.hub.handler, host, publish_port)
+        logger.info(f"Ingesting audio on {ingest_port}, publishing captions on {publish_port}")
+        await self.report_health()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive device audio and publish captions.")
+    parser.add_argument("--engine", default="google", help="google, vosk or fake")
+    parser.add_argument("--model", help="Vosk model name or directory (for --engine vosk; see models.py)")
+    parser.add_argument("--key", default="key.txt", help="Google service account key (for --engine google)")
+    parser.add_argument("--workers", type=int, default=(os.cpu_count() or 1) * 4,
+                        help="Size of the recognition worker pool")
+    parser.add_argument("--quantum", type=int, default=4,
+                        help="Chunks a worker processes for one stream before moving on")
+    parser.add_argument("--max-pending", type=int, default=100,
+                        help="Chunks queued per stream before the oldest are dropped")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--ingest-port", type=int, default=INGEST_PORT)
+    parser.add_argument("--publish-port", type=int, default=PUBLISH_PORT)
+    parser.add_argument("--loop", choices=loops.BACKENDS, help="Event loop (default: $TUB_LOOP or auto)")
+    args = parser.parse_args()
+
+    if args.engine == "google":
+        engine = create_engine("google", key_path=args.key)
+    elif args.engine == "vosk":
+        try:
+            model_path = models.resolve_model(args.model, interactive=False)
+        except ValueError as e:
+            parser.error(str(e))
+        engine = create_engine("vosk", model_path=model_path)
+    else:
+        engine = create_engine(args.engine)
+
+    server = IngestServer(engine, args.workers, quantum=args.quantum, max_pending=args.max_pending)
+    loops.run(server.serve(args.host, args.ingest_port, args.publish_port), args.loop)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
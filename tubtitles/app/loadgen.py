@@ -0,0 +1,228 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import multiprocessing
+
+import websockets
+
+import loops
+
+logger = logging.getLogger(__name__)
+
+# Benchmark messages start with their send time, so latency is read without parsing JSON
+SENT_PREFIX = '{"sentNs": '
+
+# Connections opened at once; more would overflow the server's accept backlog
+CONNECT_CONCURRENCY = 100
+
+# Ways a bench server sends one message to every subscriber: a send task per
+# client, websockets.broadcast, or the caption Hub
+STRATEGIES = ("tasks", "broadcast", "hub")
+
+
+def bench_message(size):
+    """A caption-shaped message carrying its send time, for the Hub or any broadcaster."""
+    return {"sentNs": time.time_ns(), "type": 1, "deviceId": "bench", "lang": "en", "msg": "x" * size}
+
+
+def sent_ns(message):
+    """Send time of a bench_message() as received, or None for other messages."""
+    if isinstance(message, str) and message.startswith(SENT_PREFIX):
+        return int(message[len(SENT_PREFIX):message.index(",")])
+    return None
+
+
+async def measure(url, clients, seconds, compression="deflate"):
+    """
+    Connects `clients` subscribers to `url`, then counts what they receive over
+    `seconds`. Returns counts and the latency (ms) of every timestamped message.
+    """
+    result = {"clients": clients, "connected": 0, "failed": 0, "messages": 0, "bytes": 0, "latenciesMs": []}
+    measuring = asyncio.Event()
+    gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    latencies = result["latenciesMs"]
+
+    async def subscriber():
+        try:
+            async with gate:
+                websocket = await websockets.connect(url, compression=compression,
+                                                   max_queue=None, close_timeout=1)
+            result["connected"] += 1
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+            result["failed"] += 1
+            return
+        try:
+            async for message in websocket:
+                if not measuring.is_set():
+                    continue
+                received = time.time_ns()
+                result["messages"] += 1
+                result["bytes"] += len(message)
+                sent = sent_ns(message)
+                if sent is not None:
+                    latencies.append((received - sent) / 1e6)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            await websocket.close()
+
+    tasks = [asyncio.create_task(subscriber()) for _ in range(clients)]
+    while result["connected"] + result["failed"] < clients:
+        await asyncio.sleep(0.05)
+    logger.info(f"{result['connected']} subscribers connected to {url}, {result['failed']} failed")
+    measuring.set()
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    result["seconds"] = seconds
+    return result
+
+
+def _worker(url, clients, seconds, compression, backend, results):
+    results.put(loops.run(measure(url, clients, seconds, compression), backend))
+
+
+def run(url, clients, seconds, processes=1, compression="deflate", backend=None):
+    """Runs measure() split over several processes, so the clients are not the bottleneck."""
+    if processes == 1:
+        return loops.run(measure(url, clients, seconds, compression), backend)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    shares = [clients // processes + (1 if i < clients % processes else 0) for i in range(processes)]
+    workers = [context.Process(target=_worker, args=(url, share, seconds, compression, backend, results))
+               for share in shares if share]
+    for worker in workers:
+        worker.start()
+    parts = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    merged = {"clients": clients, "seconds": seconds, "latenciesMs": []}
+    for part in parts:
+        for key in ("connected", "failed", "messages", "bytes"):
+            merged[key] = merged.get(key, 0) + part[key]
+        merged["latenciesMs"].extend(part["latenciesMs"])
+    return merged
+
+
+def _bench_server(strategy, backend, port, rate, size, ready, stop, results):
+    """
+    Server process: publishes bench_message()s at `rate` per second to every
+    connected client with one fan-out strategy, until `stop` is set, then puts
+    its publish counts and CPU time on `results`.
+    """
+    from hub import Hub
+
+    clients = set()
+    hub = Hub()
+
+    async def handler(websocket, path):
+        # Registers the client and keeps the connection open
+        clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            clients.discard(websocket)
+
+    async def fan_out(message):
+        """Sends one message to everyone and returns how many sends that was."""
+        if strategy == "hub":
+            return hub.publish(message)
+        data = json.dumps(message)
+        if strategy == "broadcast":
+            websockets.broadcast(clients, data)
+        else:
+            # One send per client, each waiting for its own socket buffer to drain
+            await asyncio.gather(*(client.send(data) for client in clients), return_exceptions=True)
+        return len(clients)
+
+    async def main():
+        server = await websockets.serve(hub.handler if strategy == "hub" else handler, "127.0.0.1", port)
+        ready.set()
+
+        loop = asyncio.get_running_loop()
+        cpu_start = time.process_time()
+        start = loop.time()
+        published = sends = 0
+        while not stop.is_set():
+            sends += await fan_out(bench_message(size))
+            published += 1
+            await asyncio.sleep(max(0, start + published / rate - loop.time()))
+        cpu = time.process_time() - cpu_start
+        results.put({
+            "published": published,
+            "publishedPerSecond": round(published / (loop.time() - start), 1),
+            "sends": sends,
+            "serverCpuSeconds": round(cpu, 2),
+            "cpuUsPerSend": round(cpu * 1e6 / sends, 2) if sends else None,
+        })
+        server.close()
+        await server.wait_closed()
+
+    loops.run(main(), backend)
+
+
+def bench(strategy, clients, rate, size, seconds, port, client_processes=1, backend=None, client_backend=None):
+    """
+    Runs a bench server (fan-out `strategy` on the `backend` event loop) in its
+    own process against `clients` subscribers spread over `client_processes`,
+    and returns the summarized measurement with the server's numbers.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}; expected one of {STRATEGIES}")
+    context = multiprocessing.get_context("spawn")
+    ready, stop, results = context.Event(), context.Event(), context.Queue()
+    server = context.Process(target=_bench_server,
+                             args=(strategy, backend, port, rate, size, ready, stop, results))
+    server.start()
+    ready.wait()
+    received = run(f"ws://127.0.0.1:{port}/", clients, seconds, client_processes, backend=client_backend)
+    stop.set()
+    published = results.get()
+    server.join()
+
+    summary = summarize(received)
+    summary.update(published)
+    summary.update({"strategy": strategy, "loop": backend or "default", "size": size, "rate": rate})
+    summary["expectedPerSecond"] = rate * summary["connected"]
+    return summary
+
+
+def summarize(result):
+    """Replaces the raw latencies with throughput and latency percentiles."""
+    latencies = sorted(result.pop("latenciesMs"))
+    summary = dict(result)
+    summary["messagesPerSecond"] = round(result["messages"] / result["seconds"], 1)
+    if latencies:
+        summary["latencyMs"] = {
+            "p50": round(latencies[len(latencies) // 2], 2),
+            "p99": round(latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)], 2),
+            "max": round(latencies[-1], 2),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Connect many caption subscribers and measure what they receive."
+    )
+    parser.add_argument("url", help="e.g. ws://localhost:8766/?types=finals")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--processes", type=int, default=1, help="Client processes to spread subscribers over")
+    parser.add_argument("--no-compression", action="store_true", help="Do not negotiate permessage-deflate")
+    parser.add_argument("--loop", choices=loops.BACKENDS, help="Event loop for the clients")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    compression = None if args.no_compression else "deflate"
+    result = run(args.url, args.clients, args.seconds, args.processes, compression, args.loop)
+    json.dump(summarize(result), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Event loop backend: "auto" (uvloop when installed), "uvloop" or "asyncio"
+LOOP_ENV = "TUB_LOOP"
+BACKENDS = ("auto", "uvloop", "asyncio")
+
+
+def available():
+    """Backends that can be used in this environment."""
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return ["asyncio"]
+    return ["asyncio", "uvloop"]
+
+
+def new_event_loop(backend=None):
+    """
+    Creates an event loop for `backend` (default: $TUB_LOOP, else "auto").
+    uvloop is optional: "auto" falls back to asyncio without it, while asking
+    for "uvloop" explicitly fails when it is not installed.
+    """
+    backend = backend or os.environ.get(LOOP_ENV, "auto")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown event loop {backend}; expected one of {BACKENDS}")
+    if backend != "asyncio":
+        try:
+            import uvloop
+
+            return uvloop.new_event_loop()
+        except ImportError:
+            if backend == "uvloop":
+                raise
+    return asyncio.new_event_loop()
+
+
+def run(main, backend=None):
+    """
+    Runs a coroutine to completion on a new loop of the chosen backend, like
+    asyncio.run(), and closes the loop afterwards.
+    """
+    try:
+        loop = new_event_loop(backend)
+    except Exception:
+        main.close()
+        raise
+    asyncio.set_event_loop(loop)
+    logger.info(f"Running on {type(loop).__module__}.{type(loop).__name__}")
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# Base path to the models
+MODEL_BASE_PATH = "../lang/models/"
+
+# Optional file naming the model to use, like me.txt names the device
+MODEL_FILE = "model.txt"
+
+# Environment variables: model to use, and model the fork server should preload
+MODEL_ENV = "VOSK_MODEL"
+PRELOAD_ENV = "VOSK_PRELOAD_MODEL"
+
+_models = {}  # absolute model path -> vosk.Model
+_load_stats = {}  # absolute model path -> metrics
+_lock = threading.Lock()
+
+
+def list_models(base_path=MODEL_BASE_PATH):
+    """List available models in the base path."""
+    try:
+        return sorted(folder for folder in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, folder)))
+    except FileNotFoundError:
+        return []
+
+
+def _prompt(models):
+    print("Available models:")
+    for idx, model_name in enumerate(models):
+        print(f"{idx + 1}. {model_name}")
+    choice = input("Select the model by number: ")
+    try:
+        model_idx = int(choice) - 1
+        if model_idx not in range(len(models)):
+            raise ValueError
+        return models[model_idx]
+    except ValueError:
+        raise ValueError("Invalid selection.")
+
+
+def resolve_model(name=None, base_path=MODEL_BASE_PATH, interactive=None):
+    """
+    Picks the model directory without needing a terminal. In order: the given
+    name or path, $VOSK_MODEL, model.txt, the only model in base_path. If none
+    of those decides it, the user is prompted only when stdin is a terminal
+    (or interactive=True). Raises ValueError when no model can be chosen.
+    """
+    if name is None:
+        name = os.environ.get(MODEL_ENV)
+    if name is None and os.path.exists(MODEL_FILE):
+        with open(MODEL_FILE, 'r') as file:
+            name = file.read().strip() or None
+
+    models = list_models(base_path)
+    if name is None:
+        if len(models) == 1:
+            name = models[0]
+        elif not models:
+            raise ValueError(f"No models found in {base_path}")
+        elif interactive or (interactive is None and sys.stdin.isatty()):
+            name = _prompt(models)
+        else:
+            raise ValueError(f"Several models in {base_path}; choose one with --model, ${MODEL_ENV} or {MODEL_FILE}: {models}")
+
+    path = name if os.path.isdir(name) else os.path.join(base_path, name)
+    if not os.path.isdir(path):
+        raise ValueError(f"Model not found at {path}")
+    return os.path.abspath(path)
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def get_model(path):
+    """
+    Returns the vosk.Model for a model directory, loading it only the first time
+    in this process. Recognizers created from the same Model share its memory.
+    """
+    path = os.path.abspath(path)
+    model = _models.get(path)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(path)
+        if model is None:
+            import vosk
+
+            rss_before = _rss_mb()
+            start = time.perf_counter()
+            model = vosk.Model(path)
+            seconds = time.perf_counter() - start
+            rss_after = _rss_mb()
+            _load_stats[path] = {
+                "seconds": round(seconds, 3),
+                "rssMb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+                "pid": os.getpid(),
+            }
+            logger.info(f"Loaded Vosk model {path} in {seconds:.2f}s: {_load_stats[path]}")
+            _models[path] = model
+    return model
+
+
+def add_model_arguments(parser):
+    """Adds the --model and --models-dir options read by load_from_args()."""
+    parser.add_argument("--model", help=f"Model name under --models-dir or a model directory "
+                                        f"(default: ${MODEL_ENV}, {MODEL_FILE}, or the only model)")
+    parser.add_argument("--models-dir", default=MODEL_BASE_PATH)
+
+
+def resolve_from_args(parser, args, interactive=None):
+    """The model directory chosen with add_model_arguments() options; a bad choice is a usage error."""
+    try:
+        return resolve_model(args.model, args.models_dir, interactive)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def load_from_args(args):
+    """
+    Loads the model chosen with add_model_arguments() options, asking only when
+    run from a terminal. Exits with the reason when no model can be chosen.
+    """
+    try:
+        return get_model(resolve_model(args.model, args.models_dir))
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+def load_stats():
+    """Load-time metrics for every model loaded in this process (or its fork server)."""
+    return dict(_load_stats)
+
+
+def preloaded_context(model_path):
+    """
+    Returns a multiprocessing context whose fork server has the model loaded.
+    Workers started from it are forked from that server, so they inherit the
+    loaded model (shared copy-on-write) and get_model() returns at once.
+
+    The path reaches the fork server through $VOSK_PRELOAD_MODEL, read by the
+    preload module it imports. The variable is only set while the server
+    starts, so no other child process of this one loads the model.
+    """
+    from multiprocessing import forkserver
+
+    # The fork server imports the preload module by name, so it must be on its path
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.environ["PYTHONPATH"] = os.pathsep.join(p for p in (here, os.environ.get("PYTHONPATH")) if p)
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["preload"])
+    os.environ[PRELOAD_ENV] = os.path.abspath(model_path)
+    try:
+        forkserver.ensure_running()
+    finally:
+        del os.environ[PRELOAD_ENV]
+    return context
+
+
+def _time_worker(started, results, path, rate):
+    import vosk
+
+    model_start = time.perf_counter()
+    model = get_model(path)
+    vosk.KaldiRecognizer(model, rate)
+    results.put({
+        "startMs": round((time.perf_counter() - started) * 1000, 1),
+        "modelAndRecognizerMs": round((time.perf_counter() - model_start) * 1000, 1),
+        "preloaded": path in _load_stats and _load_stats[path]["pid"] != os.getpid(),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select a Vosk model and time worker startup.")
+    add_model_arguments(parser)
+    parser.add_argument("--workers", type=int, default=4, help="Workers to start from the preloaded fork server")
+    parser.add_argument("--rate", type=int, default=16000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    path = resolve_from_args(parser, args)
+    # Workers must run the copy of this module the fork server preloaded, not __main__
+    from models import _time_worker
+    print(f"Model: {path}")
+
+    for method, context in (("spawn", multiprocessing.get_context("spawn")),
+                            ("preloaded forkserver", preloaded_context(path))):
+        results = context.Queue()
+        if method != "spawn":
+            # Start the fork server (and load the model in it) before timing workers
+            context.Process(target=_time_worker, args=(time.perf_counter(), results, path, args.rate)).start()
+            results.get()
+        timings = []
+        for _ in range(args.workers):
+            worker = context.Process(target=_time_worker, args=(time.perf_counter(), results, path, args.rate))
+            worker.start()
+            timings.append(results.get())
+            worker.join()
+        print(f"{method}: {timings}")
+
+
+if __name__ == "__main__":
+    main()
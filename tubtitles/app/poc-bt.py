@@ -1,53 +1,12 @@
-import os
 import queue
 import sys
 import sounddevice as sd
 import vosk
-import json
-import bluetooth  # Import PyBluez library for Bluetooth communication
+import argparse
 
-def list_models(base_path):
-    """List available models in the base path."""
-    try:
-        return [folder for folder in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, folder))]
-    except FileNotFoundError:
-        print(f"Directory {base_path} not found.")
-        sys.exit(1)
-
-def select_model(base_path):
-    """CLI-like selection of the model."""
-    models = list_models(base_path)
-    if not models:
-        print("No models found in the specified directory.")
-        sys.exit(1)
-    
-    print("Available models:")
-    for idx, model_name in enumerate(models):
-        print(f"{idx + 1}. {model_name}")
-    
-    choice = input("Select the model by number: ")
-    try:
-        model_idx = int(choice) - 1
-        if model_idx not in range(len(models)):
-            raise ValueError
-        return models[model_idx]
-    except ValueError:
-        print("Invalid selection.")
-        sys.exit(1)
-
-# Base path to the models
-model_base_path = "../lang/models/"
-
-# Select model dynamically
-model_folder = select_model(model_base_path)
-model_path = os.path.join(model_base_path, model_folder)
-
-if not os.path.exists(model_path):
-    print("Model not found at", model_path)
-    sys.exit(1)
-
-# Load the Vosk model
-model = vosk.Model(model_path)
+import models
+from engines import VoskStream
+from transport import CaptionLink, RfcommTransport
 
 # Define a queue to hold audio data
 audio_queue = queue.Queue()
@@ -58,19 +17,25 @@ def callback(indata, frames, time, status):
         print(status, file=sys.stderr)
     audio_queue.put(bytes(indata))
 
+def parse_args():
+    parser = argparse.ArgumentParser()
+    models.add_model_arguments(parser)
+    parser.add_argument("--partial-every", type=int, default=1,
+                        help="Evaluate the partial result only every N chunks")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    # Load the Vosk model (once per process; see models.py)
+    model = models.load_from_args(args)
+
     # Static variables for Bluetooth configuration
     desktop_bluetooth_address = 'XX:XX:XX:XX:XX:XX'  # Replace with your desktop's Bluetooth address
     port = 1  # Standard port for RFCOMM communication
 
-    # Set up Bluetooth connection
-    try:
-        bt_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-        bt_socket.connect((desktop_bluetooth_address, port))
-        print("Bluetooth connection established.")
-    except bluetooth.BluetoothError as e:
-        print(f"Could not connect to Bluetooth device: {e}")
-        sys.exit(1)
+    # The link connects lazily and reconnects on its own, so the model stays loaded
+    # across Bluetooth drops. Use create_transport("tcp:host:port") to test without Bluetooth.
+    link = CaptionLink(RfcommTransport(desktop_bluetooth_address, port))
 
     try:
         # Define audio stream parameters
@@ -82,29 +47,23 @@ def main():
         with sd.RawInputStream(samplerate=sample_rate, blocksize=16000, dtype='int16',
                                channels=1, callback=callback):
             print("Listening...")
-            rec = vosk.KaldiRecognizer(model, sample_rate)
+            # Partials are only emitted when they change (see VoskStream)
+            rec = VoskStream(vosk.KaldiRecognizer(model, sample_rate), partial_every=args.partial_every)
             while True:
                 data = audio_queue.get()
-                if rec.AcceptWaveform(data):
-                    result = rec.Result()
-                    text = json.loads(result)['text']
-                    print(f"Recognized: {text}")
-                    # Send text over Bluetooth
-                    try:
-                        bt_socket.send((text + '\n').encode('utf-8'))
-                    except bluetooth.BluetoothError as e:
-                        print(f"Failed to send data over Bluetooth: {e}")
-                else:
-                    partial_result = rec.PartialResult()
-                    partial_text = json.loads(partial_result)['partial']
-                    print(f"Partial: {partial_text}")
-                    # Optionally send partial results
-                    # try:
-                    #     bt_socket.send((partial_text + '\n').encode('utf-8'))
-                    # except bluetooth.BluetoothError as e:
-                    #     print(f"Failed to send data over Bluetooth: {e}")
+                for is_final, text in rec.accept(data):
+                    if is_final:
+                        print(f"Recognized: {text}")
+                        # Send text over Bluetooth
+                        link.send_final(text)
+                    else:
+                        print(f"Partial: {text}")
+                        # Partials are also rate-limited by the link
+                        link.send_partial(text)
+                link.poll()
     finally:
-        bt_socket.close()
+        print(f"Caption link stats: {link.stats()}")
+        link.close()
         print("Bluetooth connection closed.")
 
 if __name__ == "__main__":
@@ -0,0 +1,17 @@
+"""
+Imported only by the fork server started by models.preloaded_context(): loads
+the model named in $VOSK_PRELOAD_MODEL so every worker forked from the server
+inherits it. Importing models itself never loads anything.
+"""
+import os
+import logging
+
+import models
+
+logger = logging.getLogger(__name__)
+
+if os.environ.get(models.PRELOAD_ENV):
+    try:
+        models.get_model(os.environ[models.PRELOAD_ENV])
+    except Exception as e:
+        logger.error(f"Could not preload Vosk model: {e}")
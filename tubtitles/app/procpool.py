@@ -0,0 +1,185 @@
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+
+from engines import create_engine
+from streampool import StreamPool
+
+logger = logging.getLogger(__name__)
+
+# How often the collector checks that every worker process is still alive
+LIVENESS_SECONDS = 1.0
+
+
+def _worker(engine_name, engine_options, quantum, max_pending, commands, results):
+    """Worker process: recognizes the streams assigned to it with a local StreamPool."""
+    engine = create_engine(engine_name, **engine_options)
+    streams = {}
+
+    def on_results(stream, recognized):
+        results.put(("results", stream.key, recognized, stream.capture_ts))
+
+    def on_closed(stream):
+        results.put(("closed", stream.key, stream.stats()))
+
+    # One recognizer thread; this thread keeps reading commands meanwhile
+    pool = StreamPool(1, on_results, quantum=quantum, max_pending=max_pending, on_closed=on_closed)
+    while True:
+        command = commands.get()
+        op = command[0]
+        if op == "feed":
+            _, key, pcm, ts = command
+            pool.feed(streams[key], pcm, ts)
+        elif op == "open":
+            _, key, lang, rate = command
+            streams[key] = pool.open(key, engine.open_stream(lang, rate), rate)
+        elif op == "close":
+            pool.close(streams.pop(command[1]))
+        elif op == "stats":
+            results.put(("stats", {key: stream.stats() for key, stream in pool.streams.items()}))
+        elif op == "stop":
+            break
+    pool.shutdown()
+
+
+class RemoteStream:
+    """Parent-side handle for a stream recognized in a worker process."""
+
+    def __init__(self, key, rate, worker):
+        self.key = key
+        self.rate = rate
+        self.worker = worker
+        self.capture_ts = None
+        self.closed = False
+        self.last_stats = {}
+
+    def stats(self):
+        return self.last_stats
+
+
+class ProcessStreamPool:
+    """
+    Same job as StreamPool, spread over worker processes instead of threads, for
+    when per-chunk Python overhead rather than the recognizer is the bottleneck.
+    Each stream is pinned to the least loaded worker. Engines are created inside
+    the workers from a name and options, since recognizers cannot be pickled.
+
+    Pass models.preloaded_context(model_path) as `context` for Vosk so every
+    worker is forked with the model already loaded and shares its memory.
+
+    If a worker process dies (out of memory, a crash in the recognizer), its
+    streams are closed with the exit code as their "error" stat, so whoever
+    waits in on_closed is not left waiting, and no new stream goes to it.
+    """
+
+    def __init__(self, engine_name, engine_options, on_results, workers=None, quantum=4,
+                 max_pending=100, on_closed=None, context=None):
+        self.on_results = on_results
+        self.on_closed = on_closed
+        context = context or multiprocessing.get_context("spawn")
+        self._results = context.Queue()
+        self._workers = []
+        self._load = []
+        for _ in range(workers or os.cpu_count() or 1):
+            commands = context.Queue()
+            process = context.Process(
+                target=_worker,
+                args=(engine_name, engine_options, quantum, max_pending, commands, self._results),
+                daemon=True,
+            )
+            process.start()
+            self._workers.append((process, commands))
+            self._load.append(0)
+        self.streams = {}
+        self._dead = set()
+        self._stopping = False
+        self._stats_ready = threading.Event()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _check_workers(self):
+        for worker, (process, _) in enumerate(self._workers):
+            if worker in self._dead or process.is_alive():
+                continue
+            self._dead.add(worker)
+            error = f"Worker process {process.pid} exited with code {process.exitcode}"
+            streams = [stream for stream in list(self.streams.values()) if stream.worker == worker]
+            logger.error(f"{error}; failing its {len(streams)} streams")
+            for stream in streams:
+                del self.streams[stream.key]
+                stream.closed = True
+                stream.last_stats = dict(stream.last_stats, error=error)
+                if self.on_closed is not None:
+                    self.on_closed(stream)
+
+    def _collect(self):
+        checked = time.monotonic()
+        while True:
+            if not self._stopping and time.monotonic() - checked >= LIVENESS_SECONDS:
+                self._check_workers()
+                checked = time.monotonic()
+            try:
+                message = self._results.get(timeout=LIVENESS_SECONDS)
+            except queue.Empty:
+                continue
+            op = message[0]
+            if op == "results":
+                _, key, recognized, capture_ts = message
+                stream = self.streams.get(key)
+                if stream is not None:
+                    stream.capture_ts = capture_ts
+                    self.on_results(stream, recognized)
+            elif op == "closed":
+                _, key, stats = message
+                stream = self.streams.pop(key, None)
+                if stream is not None:
+                    stream.last_stats = stats
+                    self._load[stream.worker] -= 1
+                    if self.on_closed is not None:
+                        self.on_closed(stream)
+            elif op == "stats":
+                for key, stats in message[1].items():
+                    if key in self.streams:
+                        self.streams[key].last_stats = stats
+                self._stats_ready.set()
+            elif op == "stop":
+                return
+
+    def open(self, key, rate, lang="en"):
+        alive = [worker for worker in range(len(self._workers)) if worker not in self._dead]
+        if not alive:
+            raise RuntimeError("Every worker process has exited")
+        worker = min(alive, key=self._load.__getitem__)
+        self._load[worker] += 1
+        stream = RemoteStream(key, rate, worker)
+        self.streams[key] = stream
+        self._workers[worker][1].put(("open", key, lang, rate))
+        return stream
+
+    def feed(self, stream, pcm, ts=None):
+        if not stream.closed:
+            self._workers[stream.worker][1].put(("feed", stream.key, pcm, ts))
+
+    def close(self, stream):
+        if not stream.closed:
+            stream.closed = True
+            self._workers[stream.worker][1].put(("close", stream.key))
+
+    def refresh_stats(self, timeout=1.0):
+        """Fetches current stats of every open stream from the workers."""
+        for _, commands in self._workers:
+            self._stats_ready.clear()
+            commands.put(("stats",))
+            self._stats_ready.wait(timeout)
+
+    def shutdown(self):
+        self._stopping = True
+        for process, commands in self._workers:
+            commands.put(("stop",))
+        for process, _ in self._workers:
+            process.join(timeout=5)
+        self._results.put(("stop",))
+        self._collector.join(timeout=5)
@@ -0,0 +1,259 @@
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import logging
+import concurrent.futures
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+import captions
+import loops
+
+logger = logging.getLogger(__name__)
+
+# Port for the search API: GET /search?q=... over HTTP, or JSON queries over a WebSocket
+SEARCH_PORT = 8771
+
+# Finals are written in one transaction per batch, at least this often
+BATCH_SECONDS = 0.5
+BATCH_SIZE = 500
+
+SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS captions (
+    id INTEGER PRIMARY KEY,
+    device TEXT,
+    lang TEXT,
+    start_ms INTEGER,
+    end_ms INTEGER,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS captions_device_time ON captions (device, start_ms);
+CREATE VIRTUAL TABLE IF NOT EXISTS captions_fts USING fts5(
+    text, content='captions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+def fts_query(text):
+    """
+    Turns what an operator typed into an FTS5 query: every word must appear,
+    "quoted words" must appear together, and a trailing * matches prefixes.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        words = re.findall(r"\w+\*?", phrase or word)
+        if not words:
+            continue
+        if phrase:
+            terms.append('"' + " ".join(w.rstrip("*") for w in words) + '"')
+        else:
+            terms.extend(f'"{w[:-1]}"*' if w.endswith("*") else f'"{w}"' for w in words)
+    return " ".join(terms)
+
+
+def _integer(request, key):
+    # Query fields arrive as JSON values or query-string text; anything but a whole number is a bad request
+    value = request.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{key} must be an integer")
+    return int(value)
+
+
+class SearchIndex:
+    """
+    Full-text index of final captions in SQLite FTS5, ranked with bm25. Each
+    caption is a row of `captions` (device, language, times); the FTS table
+    indexes its text without storing a second copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Writes and queries each get their own connection; WAL lets them run at the same time
+        self._writer = self.connect()
+        self._writer.executescript(SCHEMA)
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def add(self, messages):
+        """Indexes a batch of final caption messages in one transaction; returns how many."""
+        rows = []
+        for message in messages:
+            if message.get("type") != captions.FINAL:
+                continue
+            text, metadata = captions.split_metadata(message.get("msg", ""))
+            if not text.strip():
+                continue
+            end_ms = metadata.get("end_time") or message.get("ts") or captions.now_ms()
+            rows.append((message.get("deviceId"), message.get("lang"),
+                         metadata.get("start_time") or end_ms, end_ms, text.strip()))
+        if not rows:
+            return 0
+        with self._writer:
+            start = self._writer.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM captions").fetchone()[0]
+            ids = range(start, start + len(rows))
+            self._writer.executemany("INSERT INTO captions VALUES (?, ?, ?, ?, ?, ?)",
+                                     [(i,) + row for i, row in zip(ids, rows)])
+            self._writer.executemany("INSERT INTO captions_fts (rowid, text) VALUES (?, ?)",
+                                     [(i, row[4]) for i, row in zip(ids, rows)])
+        return len(rows)
+
+    def search(self, text, device=None, lang=None, start_ms=None, end_ms=None, limit=20, connection=None):
+        """Returns the best matches for `text`, best first, optionally within a device, language and time range."""
+        match = fts_query(text)
+        if not match:
+            return []
+        sql = ["SELECT c.device, c.lang, c.start_ms, c.end_ms, c.text,",
+               "snippet(captions_fts, 0, '[', ']', '...', 12), bm25(captions_fts)",
+               "FROM captions_fts JOIN captions c ON c.id = captions_fts.rowid",
+               "WHERE captions_fts MATCH ?"]
+        params = [match]
+        for clause, value in (("c.device = ?", device), ("c.lang = ?", lang),
+                              ("c.end_ms >= ?", start_ms), ("c.start_ms <= ?", end_ms)):
+            if value is not None:
+                sql.append(f"AND {clause}")
+                params.append(value)
+        sql.append("ORDER BY bm25(captions_fts) LIMIT ?")
+        params.append(limit)
+        rows = (connection or self._writer).execute(" ".join(sql), params).fetchall()
+        return [{"deviceId": device, "lang": lang, "startMs": start, "endMs": end, "text": text,
+                 "snippet": snippet, "score": round(-score, 3)}
+                for device, lang, start, end, text, snippet, score in rows]
+
+    def __len__(self):
+        return self._writer.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+
+    def latest_ms(self):
+        return self._writer.execute("SELECT IFNULL(MAX(end_ms), 0) FROM captions").fetchone()[0]
+
+    def optimize(self):
+        """Merges the FTS index segments; worth running after a large backfill."""
+        with self._writer:
+            self._writer.execute("INSERT INTO captions_fts (captions_fts) VALUES ('optimize')")
+
+
+class SearchService:
+    """
+    Feeds finals from a caption hub into a SearchIndex in batches and answers
+    queries. Index writes and queries run on their own threads, so neither
+    the hub subscription nor the API waits on SQLite.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.pending = []
+        self._writes = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="search-write")
+        self._reads = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="search-read")
+        self._reader = index.connect()
+        self.indexed = 0
+        self.failed_batches = 0
+
+    def _batch_done(self, future, size):
+        if future.exception() is not None:
+            self.failed_batches += 1
+            logger.error(f"Could not index a batch of {size} finals: {future.exception()}")
+        else:
+            self.indexed += future.result()
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            future = asyncio.get_running_loop().run_in_executor(self._writes, self.index.add, batch)
+            future.add_done_callback(lambda done: self._batch_done(done, len(batch)))
+
+    async def flush_batches(self):
+        while True:
+            await asyncio.sleep(BATCH_SECONDS)
+            self.flush()
+
+    async def consume(self, url):
+        """Subscribes to the finals published at `url`, queuing them for the next batch."""
+        import websockets
+
+        separator = "&" if urlsplit(url).query else "?"
+        async for websocket in websockets.connect(f"{url}{separator}types=finals"):
+            try:
+                async for message in websocket:
+                    self.pending.append(json.loads(message))
+                    if len(self.pending) >= BATCH_SIZE:
+                        self.flush()
+            except websockets.exceptions.ConnectionClosed:
+                logger.warning(f"Caption source {url} lost; reconnecting")
+
+    async def search(self, request):
+        """Runs a query given as a dict of q, device, lang, from, to (epoch ms) and limit."""
+        if not isinstance(request, dict):
+            raise ValueError("A query must be a JSON object")
+        text = request.get("q", "")
+        if not isinstance(text, str):
+            raise ValueError("q must be a string")
+        start_ms, end_ms = _integer(request, "from"), _integer(request, "to")
+        limit = _integer(request, "limit")
+        limit = 20 if limit is None else max(1, min(limit, 1000))
+        started = time.perf_counter()
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._reads, lambda: self.index.search(
+                text, request.get("device"), request.get("lang"), start_ms, end_ms, limit,
+                connection=self._reader))
+        return {"results": results, "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    async def handler(self, websocket, path):
+        # One JSON query per message, one JSON answer per query
+        async for message in websocket:
+            try:
+                await websocket.send(json.dumps(await self.search(json.loads(message))))
+            except (ValueError, TypeError, sqlite3.Error) as e:
+                await websocket.send(json.dumps({"error": str(e)}))
+
+    async def process_request(self, path, request_headers):
+        """Answers GET /search?q=..; WebSocket upgrades continue to the handler."""
+        url = urlsplit(path)
+        if url.path != "/search":
+            return None
+        request = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            body, status = await self.search(request), HTTPStatus.OK
+        except (ValueError, TypeError, sqlite3.Error) as e:
+            body, status = {"error": str(e)}, HTTPStatus.BAD_REQUEST
+        return status, [("Content-Type", "application/json")], json.dumps(body).encode()
+
+    async def serve(self, source, host, port):
+        import websockets
+
+        await websockets.serve(self.handler, host, port, process_request=self.process_request)
+        logger.info(f"Search API on {port}; {len(self.index)} captions indexed")
+        asyncio.create_task(self.flush_batches())
+        await self.consume(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index finals from a caption hub and serve full-text search.")
+    parser.add_argument("--source", default="ws://localhost:8766/", help="Caption hub to subscribe to")
+    parser.add_argument("--db", default="captions.db", help="SQLite database file")
+    parser.add_argument("--backfill", metavar="DIR",
+                        help="First index the finals of this transcript log newer than any already indexed")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=SEARCH_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = SearchIndex(args.db)
+    if args.backfill:
+        import transcripts
+
+        finals = transcripts.query(args.backfill, t1=index.latest_ms() + 1)
+        for i in range(0, len(finals), 10000):
+            index.add(finals[i:i + 10000])
+        index.optimize()
+        logger.info(f"Backfilled {len(finals)} finals from {args.backfill}")
+    loops.run(SearchService(index).serve(args.source, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import mmap
+import struct
+import asyncio
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, capacity, bytes written (a logical offset that only grows), next sequence number
+HEADER = struct.Struct("<8sQQQ")
+MAGIC = b"TUBFEED1"
+COUNTER = struct.Struct("<Q")
+WRITTEN_OFFSET = 16
+SEQUENCE_OFFSET = 24
+
+# Record: sequence number, payload length
+RECORD = struct.Struct("<QI")
+
+# Where feeds live by default: memory-backed on Linux
+FEED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def feed_path(name):
+    return os.path.join(FEED_DIR, f"{name}.feed")
+
+
+class Feed:
+    """
+    Single-writer, many-reader broadcast ring in shared memory. One process
+    publishes each message once; any number of processes read every message
+    on their own, at their own pace, without locks or copies per reader.
+
+    Like the Spool, positions are logical byte offsets that only grow and
+    records wrap around the end of the data region. The writer never waits for
+    readers: a reader that falls a whole ring behind skips ahead to the newest
+    data and counts what it missed.
+    """
+
+    def __init__(self, path, capacity=None):
+        """Creates the feed when `capacity` is given, else attaches to an existing one."""
+        self.path = path
+        if capacity is not None:
+            with open(path, "w+b") as file:
+                file.write(b"\0" * (HEADER.size + capacity))
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        if capacity is not None:
+            HEADER.pack_into(self._map, 0, MAGIC, capacity, 0, 0)
+        # A restarted writer continues where the previous one stopped
+        magic, self.capacity, self.written, self.sequence = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a feed")
+        # Records are limited so a reader can always tell whether one was overwritten
+        self.max_record = self.capacity // 4
+
+    def _write(self, offset, data):
+        position = offset % self.capacity
+        first = min(len(data), self.capacity - position)
+        start = HEADER.size + position
+        self._map[start:start + first] = data[:first]
+        if first < len(data):
+            self._map[HEADER.size:HEADER.size + len(data) - first] = data[first:]
+
+    def publish(self, data):
+        """Appends one message for every reader."""
+        size = RECORD.size + len(data)
+        if size > self.max_record:
+            raise ValueError(f"Message of {len(data)} bytes is too large for feed {self.path}")
+        self._write(self.written, RECORD.pack(self.sequence, len(data)) + data)
+        self.sequence += 1
+        COUNTER.pack_into(self._map, SEQUENCE_OFFSET, self.sequence)
+        # Readers only look at records before `written`, so publish it last
+        self.written += size
+        COUNTER.pack_into(self._map, WRITTEN_OFFSET, self.written)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class FeedReader:
+    """Reads a Feed from the current end on, in this or any other process."""
+
+    def __init__(self, path, start=None):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.capacity, written, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a feed")
+        self.max_record = self.capacity // 4
+        self.position = written if start is None else start
+        self.sequence = None  # Sequence number expected next
+        self.received = 0
+        self.dropped = 0
+
+    def _written(self):
+        return COUNTER.unpack_from(self._map, WRITTEN_OFFSET)[0]
+
+    def _read(self, offset, size):
+        position = offset % self.capacity
+        first = min(size, self.capacity - position)
+        start = HEADER.size + position
+        data = self._map[start:start + first]
+        if first < size:
+            data += self._map[HEADER.size:HEADER.size + size - first]
+        return data
+
+    def _overwritten(self, written):
+        # The writer may be writing up to one record past `written`
+        return written + self.max_record - self.position > self.capacity
+
+    def read(self, max_records=100):
+        """Returns the messages published since the last call (up to max_records)."""
+        messages = []
+        written = self._written()
+        while self.position < written and (max_records is None or len(messages) < max_records):
+            if self._overwritten(written):
+                # Lapped by the writer: skip to the newest data; the gap shows in the sequence numbers
+                logger.warning(f"Reader of {self.path} fell behind; skipping ahead")
+                self.position = written
+                break
+            sequence, length = RECORD.unpack(self._read(self.position, RECORD.size))
+            data = self._read(self.position + RECORD.size, length)
+            written = self._written()
+            if self._overwritten(written):
+                continue  # Overwritten while being copied
+            if self.sequence is not None and sequence > self.sequence:
+                self.dropped += sequence - self.sequence
+            self.sequence = sequence + 1
+            self.position += RECORD.size + length
+            self.received += 1
+            messages.append(data)
+        return messages
+
+    async def messages(self, poll_interval=0.005):
+        """Yields messages as they are published, polling while the feed is idle."""
+        while True:
+            batch = self.read()
+            if not batch:
+                await asyncio.sleep(poll_interval)
+            for data in batch:
+                yield data
+
+    def stats(self):
+        return {"received": self.received, "dropped": self.dropped, "behindBytes": self._written() - self.position}
+
+    def close(self):
+        self._map.close()
+        self._file.close()
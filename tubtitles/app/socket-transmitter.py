@@ -1,7 +1,17 @@
+import os
 import asyncio
-import websockets
+import logging
 import sounddevice as sd
 
+import audiocodec
+import loops
+from spool import Spool
+from uplink import UplinkSender
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # WebSocket server URL
 WS_URL = "ws://18.144.94.245:8765"  # Replace with your EC2 instance IP
 
@@ -10,60 +20,61 @@ SAMPLE_RATE = 16000  # Ensure this matches the recognizer's expectation
 CHANNELS = 1
 BLOCKSIZE = 8000  # Adjust depending on desired chunk size and performance
 
-async def send_audio_chunk(websocket, data):
-    """Send audio chunk to the WebSocket."""
-    await websocket.send(data)
+# Uplink queue limits, in blocks
+MAX_QUEUED_BLOCKS = 20  # Oldest audio is spooled beyond this
+MAX_BLOCKS_PER_MESSAGE = 4  # Queued blocks are coalesced up to this many per send
 
-def callback(indata, frames, time, status, websocket, loop):
-    """Callback function to send audio chunks via WebSocket."""
-    if status:
-        print(f"Audio status: {status}")
+# Audio captured while the uplink is down is spooled to disk and uploaded after reconnecting
+SPOOL_PATH = "uplink.spool"
+SPOOL_MB = 64  # About 35 minutes of 16 kHz int16 audio
+CATCHUP_RATIO = 2  # Spooled messages sent per live message while catching up
 
-    # Correctly convert the CFFI buffer to bytes
-    data = bytes(indata)
+# Codecs offered to the server, most preferred first (see audiocodec.py and bench-codecs.py)
+# Raw PCM is 256 kbit/s; mu-law halves that and ADPCM quarters it
+CODECS = audiocodec.PREFERENCE
 
-    # Schedule the coroutine to send data using run_coroutine_threadsafe
-    asyncio.run_coroutine_threadsafe(send_audio_chunk(websocket, data), loop)
+# Device name, announced to the ingest server in the handshake
+DEVICE_ID = None
+if os.path.exists("me.txt"):
+    with open("me.txt", 'r') as file:
+        DEVICE_ID = file.read().strip() or None
 
 
-async def send_audio(websocket):
-    """Stream audio from the microphone and send it to the WebSocket server."""
-    
-    loop = asyncio.get_event_loop()  # Get the current event loop
+def callback(indata, frames, time, status, sender):
+    """Callback function to queue audio chunks for the uplink."""
+    if status:
+        print(f"Audio status: {status}")
+
+    # Correctly convert the CFFI buffer to bytes; push never blocks the audio thread
+    sender.push(bytes(indata))
 
-    async def receive_messages():
-        """Receive messages from the websocket to process ping/pong frames."""
-        try:
-            async for message in websocket:
-                # Process messages if necessary
-                pass
-        except websockets.exceptions.ConnectionClosed:
-            pass
 
-    # Start the receive_messages task
-    receive_task = asyncio.create_task(receive_messages())
+async def stream_audio():
+    """Stream audio from the microphone to the WebSocket server, reconnecting as needed."""
+    hello = {"rate": SAMPLE_RATE}
+    if DEVICE_ID:
+        hello["deviceId"] = DEVICE_ID
+    spool = Spool(SPOOL_PATH, capacity=SPOOL_MB * 1024 * 1024)
+    sender = UplinkSender(WS_URL, hello=hello, max_frames=MAX_QUEUED_BLOCKS,
+                          max_batch=MAX_BLOCKS_PER_MESSAGE, spool=spool,
+                          catchup_ratio=CATCHUP_RATIO, codecs=CODECS, rate=SAMPLE_RATE)
 
-    # Open an audio stream
+    # Open an audio stream; it stays open across reconnects
     with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=BLOCKSIZE, dtype='int16',
-                           channels=CHANNELS, callback=lambda indata, frames, time, status: callback(indata, frames, time, status, websocket, loop)):
-        print("Streaming audio...")
+                           channels=CHANNELS, callback=lambda indata, frames, time, status: callback(indata, frames, time, status, sender)):
+        print(f"Streaming audio to {WS_URL}...")
+        report_task = asyncio.create_task(sender.report())
         try:
-            await asyncio.Future()  # Keep the stream open until interrupted
+            await sender.run()
         except asyncio.CancelledError:
             pass
+        finally:
+            report_task.cancel()
+            spool.close()
 
-    # When done, cancel the receive task
-    receive_task.cancel()
-
-
-async def connect_to_server():
-    """Connect to the WebSocket server and initiate audio streaming."""
-    async with websockets.connect(WS_URL) as websocket:
-        print(f"Connected to WebSocket server at {WS_URL}")
-        await send_audio(websocket)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(connect_to_server())
+        loops.run(stream_audio())
     except KeyboardInterrupt:
         print("Connection closed.")
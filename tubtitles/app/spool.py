@@ -0,0 +1,135 @@
+import os
+import mmap
+import struct
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, version, capacity, head, tail, records, dropped
+HEADER = struct.Struct("<8sIxxxxQQQQQ")
+MAGIC = b"TUBSPOOL"
+VERSION = 1
+
+# Record: payload length, capture timestamp in epoch milliseconds
+RECORD = struct.Struct("<IQ")
+
+
+class Spool:
+    """
+    Memory-mapped on-disk ring of timestamped audio frames.
+
+    head and tail are logical byte offsets that only grow; the position in the
+    data region is the offset modulo the capacity, and records may wrap around
+    the end. When the ring is full the oldest records are dropped. The header is
+    kept in the file, so audio spooled before a restart is still drained after it.
+    """
+
+    def __init__(self, path, capacity=64 * 1024 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            # Write the whole file up front so the capture path never extends it
+            self._file.write(b"\0" * (HEADER.size + capacity))
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+        magic, version, stored_capacity, head, tail, records, dropped = HEADER.unpack_from(self._map, 0)
+        if exists and magic == MAGIC and version == VERSION:
+            self.capacity = stored_capacity
+            self.head, self.tail, self.records, self.dropped = head, tail, records, dropped
+            if records:
+                logger.info(f"Spool {path} has {records} frames from a previous run")
+        else:
+            self.capacity = len(self._map) - HEADER.size
+            self.head = self.tail = self.records = self.dropped = 0
+            self._write_header()
+
+    def __len__(self):
+        return self.records
+
+    @property
+    def used(self):
+        return self.tail - self.head
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.capacity,
+                         self.head, self.tail, self.records, self.dropped)
+
+    def _write(self, offset, data):
+        position = offset % self.capacity
+        first = min(len(data), self.capacity - position)
+        start = HEADER.size + position
+        self._map[start:start + first] = data[:first]
+        if first < len(data):
+            self._map[HEADER.size:HEADER.size + len(data) - first] = data[first:]
+
+    def _read(self, offset, size):
+        position = offset % self.capacity
+        first = min(size, self.capacity - position)
+        start = HEADER.size + position
+        data = self._map[start:start + first]
+        if first < size:
+            data += self._map[HEADER.size:HEADER.size + size - first]
+        return data
+
+    def _drop_oldest(self):
+        length, _ = RECORD.unpack(self._read(self.head, RECORD.size))
+        self.head += RECORD.size + length
+        self.records -= 1
+        self.dropped += 1
+
+    def append(self, ts_ms, data):
+        """Appends one frame, dropping the oldest frames if the ring is full."""
+        size = RECORD.size + len(data)
+        if size > self.capacity:
+            raise ValueError(f"Frame of {len(data)} bytes does not fit in the spool")
+        with self._lock:
+            while self.used + size > self.capacity:
+                self._drop_oldest()
+            self._write(self.tail, RECORD.pack(len(data), ts_ms))
+            self._write(self.tail + RECORD.size, data)
+            self.tail += size
+            self.records += 1
+            self._write_header()
+
+    def peek(self, max_records=1):
+        """
+        Returns up to max_records of the oldest (ts_ms, data) frames without
+        removing them, and the offset to commit() once they have been sent.
+        """
+        frames = []
+        with self._lock:
+            offset = self.head
+            while len(frames) < min(max_records, self.records):
+                length, ts_ms = RECORD.unpack(self._read(offset, RECORD.size))
+                frames.append((ts_ms, self._read(offset + RECORD.size, length)))
+                offset += RECORD.size + length
+        return frames, offset
+
+    def commit(self, offset):
+        """Removes the frames before a peek()ed offset, except those already dropped to make room."""
+        with self._lock:
+            while self.records and self.head < offset:
+                length, _ = RECORD.unpack(self._read(self.head, RECORD.size))
+                self.head += RECORD.size + length
+                self.records -= 1
+            if not self.records:
+                # Rewind so the next outage writes from the start of the file
+                self.head = self.tail = 0
+            self._write_header()
+
+    def pop(self, max_records=1):
+        """Removes and returns up to max_records of the oldest (ts_ms, data) frames."""
+        frames, offset = self.peek(max_records)
+        self.commit(offset)
+        return frames
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
@@ -0,0 +1,203 @@
+import os
+import time
+import logging
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import audio
+
+logger = logging.getLogger(__name__)
+
+# Capture ts of a chunk dropped from a stream with a decoder: it is only decoded,
+# to keep stateful codecs such as ADPCM in step, and never recognized
+_DROPPED = object()
+
+
+class Stream:
+    """One audio stream being recognized by a StreamPool."""
+
+    def __init__(self, key, recognizer, rate, max_pending, decoder=None):
+        self.key = key
+        self.recognizer = recognizer
+        self.decoder = decoder  # decodes chunks to PCM in the worker, see audiocodec.py
+        self.rate = rate
+        self.pending = collections.deque()  # (received monotonic time, chunk, capture ts)
+        self.capture_ts = None  # capture time (epoch ms) of the chunk being recognized, if known
+        self.max_pending = max_pending
+        self.scheduled = False
+        self.closed = False
+        self.error = None  # why recognition stopped, if the recognizer raised
+
+        # Stats
+        self.chunks = 0
+        self.dropped = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0  # time spent in the recognizer
+        self.lag = 0.0  # seconds between receiving a chunk and finishing it
+        self.max_lag = 0.0
+
+    def stats(self):
+        return {
+            "chunks": self.chunks,
+            "dropped": self.dropped,
+            "pending": len(self.pending),
+            "audioSeconds": round(self.audio_seconds, 3),
+            # Real-time factor: recognizer time per second of audio; must stay below 1 to keep up
+            "rtf": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            "lagMs": int(self.lag * 1000),
+            "maxLagMs": int(self.max_lag * 1000),
+            "error": self.error,
+        }
+
+
+class StreamPool:
+    """
+    Runs recognition for many audio streams on a bounded pool of worker threads.
+    A stream is handled by at most one worker at a time, so its recognizer never
+    sees concurrent calls, and a worker handles at most `quantum` chunks of one
+    stream before re-queueing it behind the others.
+
+    on_results(stream, results) is called from the worker thread with the
+    (is_final, transcript) list returned by the recognizer, and on_closed(stream)
+    once a closed stream has been flushed, or once its recognizer has raised
+    (with the error in stream.stats()). max_pending=None never drops audio,
+    which suits offline transcription.
+
+    The pool defaults to one worker per core. Native recognizers such as Vosk
+    release the GIL while decoding, so the threads really run in parallel.
+    """
+
+    def __init__(self, workers, on_results, quantum=4, max_pending=100, on_closed=None):
+        self.on_results = on_results
+        self.on_closed = on_closed
+        self.quantum = quantum
+        self.max_pending = max_pending
+        workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recognizer")
+        self._lock = threading.Lock()
+        self.streams = {}
+
+    def open(self, key, recognizer, rate, decoder=None):
+        stream = Stream(key, recognizer, rate, self.max_pending, decoder)
+        self.streams[key] = stream
+        return stream
+
+    def _schedule(self, stream):
+        # Must be called with the lock held
+        if not stream.scheduled:
+            stream.scheduled = True
+            self._executor.submit(self._run, stream)
+
+    def feed(self, stream, pcm, ts=None):
+        """
+        Queues a chunk of audio for a stream. Never blocks on recognition.
+        ts is the capture time of the chunk in epoch ms, when the client sent one.
+        """
+        with self._lock:
+            if stream.closed:
+                return
+            if (stream.max_pending and len(stream.pending) >= stream.max_pending
+                    and sum(chunk_ts is not _DROPPED for _, _, chunk_ts in stream.pending) >= stream.max_pending):
+                # Recognition cannot keep up; drop the oldest audio rather than grow lag forever.
+                # Recognizer switches are never dropped
+                oldest = next((i for i, (_, chunk, chunk_ts) in enumerate(stream.pending)
+                               if chunk is not None and chunk_ts is not _DROPPED), None)
+                if oldest is not None:
+                    if stream.decoder is None:
+                        del stream.pending[oldest]
+                    else:
+                        # Still decoded in order, since codec state runs through every chunk
+                        received, chunk, _ = stream.pending[oldest]
+                        stream.pending[oldest] = (received, chunk, _DROPPED)
+                    stream.dropped += 1
+            stream.pending.append((time.monotonic(), pcm, ts))
+            self._schedule(stream)
+
+    def switch(self, stream, recognizer, **attributes):
+        """
+        Replaces a stream's recognizer once the audio queued so far has been
+        processed: the old recognizer is flushed, then `recognizer` and the given
+        attributes are set on the stream. The decoder carries over, so codec
+        state stays in step with the client.
+        """
+        with self._lock:
+            if stream.closed:
+                return
+            stream.pending.append((time.monotonic(), None, (recognizer, attributes)))
+            self._schedule(stream)
+
+    def close(self, stream):
+        """Flushes and closes a stream once its pending audio is processed."""
+        with self._lock:
+            if stream.error is not None:
+                return  # Already closed and reported when its recognizer failed
+            stream.closed = True
+            self._schedule(stream)
+
+    def _run(self, stream):
+        notified = False
+        try:
+            with self._lock:
+                batch = [stream.pending.popleft() for _ in range(min(self.quantum, len(stream.pending)))]
+
+            for received, pcm, ts in batch:
+                if pcm is None:
+                    recognizer, attributes = ts
+                    results = stream.recognizer.close()
+                    if results:
+                        self.on_results(stream, results)
+                    stream.recognizer = recognizer
+                    for name, value in attributes.items():
+                        setattr(stream, name, value)
+                    continue
+                if stream.decoder is not None:
+                    # Decoded here rather than in feed(), so it never holds up the event loop
+                    pcm = stream.decoder.decode(pcm)
+                    if ts is _DROPPED:
+                        continue
+                stream.capture_ts = ts
+                started = time.perf_counter()
+                results = stream.recognizer.accept(pcm)
+                stream.busy_seconds += time.perf_counter() - started
+                stream.chunks += 1
+                stream.audio_seconds += audio.duration(pcm, stream.rate)
+                stream.lag = time.monotonic() - received
+                stream.max_lag = max(stream.max_lag, stream.lag)
+                if results:
+                    self.on_results(stream, results)
+
+            with self._lock:
+                finished = stream.closed and not stream.pending
+            if finished:
+                results = stream.recognizer.close()
+                if results:
+                    self.on_results(stream, results)
+                if self.streams.get(stream.key) is stream:
+                    del self.streams[stream.key]
+                if self.on_closed is not None:
+                    notified = True
+                    self.on_closed(stream)
+        except Exception as e:
+            logger.error(f"Exception recognizing stream {stream.key}: {e}")
+            finished = True
+            with self._lock:
+                stream.closed = True
+                stream.error = f"{type(e).__name__}: {e}"
+                stream.pending.clear()
+            if self.streams.get(stream.key) is stream:
+                del self.streams[stream.key]
+            # Whoever waits for the stream to finish must hear about it failing too
+            if self.on_closed is not None and not notified:
+                try:
+                    self.on_closed(stream)
+                except Exception as e:
+                    logger.error(f"Exception in on_closed for stream {stream.key}: {e}")
+
+        with self._lock:
+            stream.scheduled = False
+            if not finished and (stream.pending or stream.closed):
+                self._schedule(stream)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import random
+import asyncio
+import argparse
+import logging
+import datetime
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+import srt
+import websockets
+
+import captions
+import loops
+from hub import Hub
+
+logger = logging.getLogger(__name__)
+
+# Port for live subtitle players: HTTP tails and a WebSocket cue stream
+SUBTITLE_PORT = 8770
+
+# Cues kept in memory per device and language for the tail endpoints
+TAIL_CUES = 200
+
+
+def vtt_timestamp(delta):
+    return srt.timedelta_to_srt_timestamp(delta).replace(",", ".")
+
+
+def to_vtt(cue):
+    """One WebVTT cue, in the same layout srt.Subtitle.to_srt() uses."""
+    return f"{cue.index}\n{vtt_timestamp(cue.start)} --> {vtt_timestamp(cue.end)}\n{cue.content}\n\n"
+
+
+class SubtitleWriter:
+    """
+    Appends the cues of one device and language to an .srt and a .vtt file as
+    they arrive. Files are only ever appended to, and only the last `tail`
+    cues are held in memory, so a session can run for hours. Cue times are
+    relative to `origin_ms`, the start of the first caption of the session.
+    """
+
+    def __init__(self, directory, device_id, lang, origin_ms, tail=TAIL_CUES):
+        self.origin_ms = origin_ms
+        self.cues = deque(maxlen=tail)
+        self.count = 0
+        name = re.sub(r"[^\w.-]", "_", f"{device_id}-{lang}-{origin_ms}")
+        self.base = os.path.join(directory, name)
+        self._srt = open(self.base + ".srt", "a", encoding="utf-8")
+        self._vtt = open(self.base + ".vtt", "a", encoding="utf-8")
+        if self._vtt.tell() == 0:
+            self._vtt.write("WEBVTT\n\n")
+        logger.info(f"Writing subtitles to {self.base}.srt/.vtt")
+
+    def _delta(self, epoch_ms):
+        return datetime.timedelta(milliseconds=max(0, epoch_ms - self.origin_ms))
+
+    def add(self, text, start_ms, end_ms):
+        """Appends a cue and returns it."""
+        self.count += 1
+        cue = srt.Subtitle(self.count, self._delta(start_ms), self._delta(max(start_ms, end_ms)), text.strip())
+        self._srt.write(cue.to_srt())
+        self._vtt.write(to_vtt(cue))
+        self._srt.flush()
+        self._vtt.flush()
+        self.cues.append(cue)
+        return cue
+
+    def tail_srt(self, n):
+        return "".join(cue.to_srt() for cue in list(self.cues)[-n:])
+
+    def tail_vtt(self, n):
+        return "WEBVTT\n\n" + "".join(to_vtt(cue) for cue in list(self.cues)[-n:])
+
+    def close(self):
+        self._srt.close()
+        self._vtt.close()
+
+
+class SubtitleSink:
+    """
+    Turns finals into subtitle files, one pair per device and language, and
+    serves them live: GET /tail.srt or /tail.vtt?device=..&lang=..&n=.. returns
+    the latest cues, and a WebSocket on any other path receives every new cue,
+    filtered by the same ?devices=&langs= topics as the caption hub.
+    """
+
+    def __init__(self, directory, tail=TAIL_CUES):
+        self.directory = directory
+        self.tail = tail
+        self.writers = {}
+        self.hub = Hub()
+        os.makedirs(directory, exist_ok=True)
+
+    def handle(self, message):
+        """Adds a final caption message as a cue; other messages are ignored."""
+        if message.get("type") != captions.FINAL:
+            return None
+        text, metadata = captions.split_metadata(message.get("msg", ""))
+        if not text.strip():
+            return None
+        end_ms = metadata.get("end_time") or message.get("ts") or captions.now_ms()
+        start_ms = metadata.get("start_time") or end_ms
+        key = (message.get("deviceId"), message.get("lang"))
+        writer = self.writers.get(key)
+        if writer is None:
+            writer = self.writers[key] = SubtitleWriter(self.directory, key[0], key[1], start_ms, self.tail)
+        cue = writer.add(text, start_ms, end_ms)
+        self.hub.publish({
+            "type": captions.FINAL,
+            "deviceId": key[0],
+            "lang": key[1],
+            "index": cue.index,
+            "startMs": int(cue.start.total_seconds() * 1000),
+            "endMs": int(cue.end.total_seconds() * 1000),
+            "text": cue.content,
+            "vtt": to_vtt(cue),
+        })
+        return cue
+
+    async def consume(self, url, max_backoff=30.0):
+        """Subscribes to the finals published at `url`, reconnecting with jittered backoff."""
+        separator = "&" if urlsplit(url).query else "?"
+        url = f"{url}{separator}types=finals"
+        backoff = 0.5
+        while True:
+            try:
+                async with websockets.connect(url) as websocket:
+                    logger.info(f"Subscribed to {url}")
+                    backoff = 0.5
+                    async for message in websocket:
+                        try:
+                            self.handle(json.loads(message))
+                        except (json.JSONDecodeError, OSError) as e:
+                            logger.error(f"Could not write cue: {e}")
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logger.warning(f"Caption source {url} lost ({e}); retrying in {backoff:.1f}s")
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+            backoff = min(backoff * 2, max_backoff)
+
+    def _writer_for(self, query):
+        device = query.get("device", [None])[0]
+        lang = query.get("lang", [None])[0]
+        matches = [writer for (d, l), writer in self.writers.items()
+                   if device in (None, d) and lang in (None, l)]
+        return matches[0] if len(matches) == 1 else None
+
+    async def process_request(self, path, request_headers):
+        """Answers the HTTP tail requests; WebSocket upgrades continue to the hub."""
+        url = urlsplit(path)
+        if url.path not in ("/tail.srt", "/tail.vtt"):
+            return None
+        query = parse_qs(url.query)
+        writer = self._writer_for(query)
+        if writer is None:
+            body = f"Choose one of: {sorted(self.writers)} with ?device=&lang=\n"
+            return HTTPStatus.NOT_FOUND, [("Content-Type", "text/plain")], body.encode()
+        try:
+            n = int(query.get("n", [self.tail])[0])
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, [("Content-Type", "text/plain")], b"n must be a whole number\n"
+        # The writer only keeps its last `tail` cues
+        n = max(1, min(n, self.tail))
+        if url.path == "/tail.srt":
+            return HTTPStatus.OK, [("Content-Type", "application/x-subrip; charset=utf-8")], writer.tail_srt(n).encode()
+        return HTTPStatus.OK, [("Content-Type", "text/vtt; charset=utf-8")], writer.tail_vtt(n).encode()
+
+    async def serve(self, source, host, port):
+        await websockets.serve(self.hub.handler, host, port, process_request=self.process_request)
+        logger.info(f"Serving subtitles on {port}")
+        await self.consume(source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write finals as SRT/WebVTT files and serve them live.")
+    parser.add_argument("--source", default="ws://localhost:8766/",
+                        help="Caption hub to subscribe to; may include ?devices=&langs= topics")
+    parser.add_argument("--dir", default="subtitles", help="Directory for the subtitle files")
+    parser.add_argument("--tail", type=int, default=TAIL_CUES, help="Cues kept in memory per stream")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=SUBTITLE_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sink = SubtitleSink(args.dir, args.tail)
+    try:
+        loops.run(sink.serve(args.source, args.host, args.port))
+    finally:
+        for writer in sink.writers.values():
+            writer.close()
+
+
+if __name__ == "__main__":
+    main()
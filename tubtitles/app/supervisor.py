@@ -0,0 +1,158 @@
+import time
+import random
+import logging
+import threading
+import multiprocessing
+import multiprocessing.connection
+
+logger = logging.getLogger(__name__)
+
+
+def process_memory(pid):
+    """
+    Resident memory of a process in MB: RSS, and PSS, which splits pages shared
+    between processes among them so that PSS values add up to a real total.
+    """
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    memory[f"{key.lower()}Mb"] = round(int(value.split()[0]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return memory
+
+
+class Role:
+    """One supervised worker process and its restart history."""
+
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.started_at = None
+        self.exited_at = None
+        self.restart_at = None
+        self.backoff = None
+        self.restarts = 0
+        self.last_exit_code = None
+        self.last_recover_ms = None
+        self.max_recover_ms = 0.0
+
+    def stats(self):
+        return {
+            "alive": self.process is not None and self.process.is_alive(),
+            "restarts": self.restarts,
+            "lastExitCode": self.last_exit_code,
+            "lastRecoverMs": self.last_recover_ms,
+            "maxRecoverMs": self.max_recover_ms,
+        }
+
+
+class Supervisor:
+    """
+    Runs worker roles as processes and restarts any that exits. The first
+    restart after a failure happens after `min_backoff` seconds; a role that
+    keeps failing waits twice as long each time up to `max_backoff`, with
+    jitter. A role that stayed up for `stable_seconds` starts over at
+    `min_backoff`. Time to recover is measured from the exit being noticed
+    to the replacement process running.
+
+    `on_change`, if given, is called with stats() after every restart.
+
+    stop() may be called from another thread: no role is started once it has
+    begun, and a role still running `kill_after` seconds after SIGTERM is killed.
+    """
+
+    def __init__(self, min_backoff=0.05, max_backoff=30.0, stable_seconds=60,
+                 context=None, on_change=None):
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.context = context or multiprocessing.get_context()
+        self.on_change = on_change
+        self.roles = {}
+        self._stopping = False
+        self._lock = threading.Lock()  # Held while starting a role, so stop() cannot miss it
+
+    def add(self, name, target, args=()):
+        self.roles[name] = Role(name, target, args)
+
+    def _start(self, role):
+        role.process = self.context.Process(target=role.target, args=role.args, name=role.name, daemon=True)
+        role.process.start()
+        role.started_at = time.monotonic()
+        role.restart_at = None
+        if role.exited_at is not None:
+            role.restarts += 1
+            role.last_recover_ms = round((role.started_at - role.exited_at) * 1000, 1)
+            role.max_recover_ms = max(role.max_recover_ms, role.last_recover_ms)
+            logger.info(f"Restarted {role.name} in {role.last_recover_ms} ms (restart {role.restarts})")
+            if self.on_change is not None:
+                self.on_change(self.stats())
+
+    def _exited(self, role):
+        role.process.join()
+        role.exited_at = time.monotonic()
+        role.last_exit_code = role.process.exitcode
+        role.process = None
+        if role.backoff is None or role.exited_at - role.started_at > self.stable_seconds:
+            role.backoff = self.min_backoff
+        else:
+            role.backoff = min(role.backoff * 2, self.max_backoff)
+        delay = role.backoff * random.uniform(0.5, 1.5)
+        role.restart_at = role.exited_at + delay
+        logger.warning(f"{role.name} exited with code {role.last_exit_code}; restarting in {delay * 1000:.0f} ms")
+
+    def run(self):
+        """Starts every role and keeps them running until stop() is called."""
+        for role in self.roles.values():
+            with self._lock:
+                if self._stopping:
+                    return
+                self._start(role)
+        while not self._stopping:
+            timeout = 1.0
+            now = time.monotonic()
+            for role in self.roles.values():
+                if role.restart_at is None:
+                    continue
+                if now >= role.restart_at:
+                    with self._lock:
+                        if self._stopping:
+                            return
+                        self._start(role)
+                else:
+                    timeout = min(timeout, role.restart_at - now)
+
+            # Sleep until a role exits or a restart is due
+            running = {role.process.sentinel: role for role in self.roles.values() if role.process is not None}
+            for sentinel in multiprocessing.connection.wait(list(running), timeout):
+                with self._lock:
+                    if not self._stopping:
+                        self._exited(running[sentinel])
+
+    def stop(self, kill_after=5.0):
+        with self._lock:
+            self._stopping = True
+            processes = [role.process for role in self.roles.values() if role.process is not None]
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + kill_after
+        for process in processes:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"{process.name} ignored SIGTERM for {kill_after} s; killing it")
+                process.kill()
+                process.join()
+
+    def stats(self):
+        return {name: role.stats() for name, role in self.roles.items()}
+
+    def memory(self):
+        """process_memory() of every running role."""
+        return {name: process_memory(role.process.pid)
+                for name, role in self.roles.items() if role.process is not None}
@@ -0,0 +1,157 @@
+import threading
+
+from engines import FakeEngine
+from streampool import StreamPool
+
+RATE = 16000
+CHUNK = b"\0" * (RATE // 10 * 2)  # 100 ms of silence
+
+
+def test_on_closed_fires_when_recognizer_raises():
+    closed = []
+    done = threading.Event()
+
+    def on_closed(stream):
+        closed.append(stream.stats())
+        done.set()
+
+    pool = StreamPool(1, lambda stream, results: None, on_closed=on_closed)
+    engine = FakeEngine(fault_after_ms=250)
+    stream = pool.open("device", engine.open_stream("en", RATE), RATE)
+    for _ in range(5):
+        pool.feed(stream, CHUNK)
+
+    assert done.wait(5), "on_closed was not called after the recognizer raised"
+    assert len(closed) == 1
+    assert "Injected fault" in closed[0]["error"]
+    assert "device" not in pool.streams
+    pool.shutdown()
+
+
+def test_on_closed_fires_once_on_normal_close():
+    closed = []
+    done = threading.Event()
+
+    def on_closed(stream):
+        closed.append(stream.stats())
+        done.set()
+
+    pool = StreamPool(1, lambda stream, results: None, on_closed=on_closed)
+    stream = pool.open("device", FakeEngine().open_stream("en", RATE), RATE)
+    pool.feed(stream, CHUNK)
+    pool.close(stream)
+
+    assert done.wait(5)
+    assert len(closed) == 1
+    assert closed[0]["error"] is None
+    pool.shutdown()
+
+
+def test_close_after_failure_does_not_report_twice():
+    closed = []
+    done = threading.Event()
+
+    def on_closed(stream):
+        closed.append(stream.stats())
+        done.set()
+
+    pool = StreamPool(1, lambda stream, results: None, on_closed=on_closed)
+    stream = pool.open("device", FakeEngine(fault_after_ms=50).open_stream("en", RATE), RATE)
+    pool.feed(stream, CHUNK)
+    assert done.wait(5)
+    pool.close(stream)
+    pool.feed(stream, CHUNK)
+    pool.shutdown()
+    assert len(closed) == 1
+
+
+class RecordingRecognizer:
+    """Keeps the PCM it is fed; blocks until `gate` is set."""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.fed = []
+
+    def accept(self, pcm):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.fed.append(pcm)
+        return []
+
+    def close(self):
+        return []
+
+
+def test_dropping_encoded_audio_keeps_decoder_in_step():
+    import audiocodec
+    from array import array
+
+    codec = audiocodec.get_codec("adpcm")
+    encoder = codec.encoder(RATE)
+    chunks = [array('h', [(i * 37 + n * 1000) % 8000 - 4000 for i in range(1600)]).tobytes() for n in range(20)]
+    reference = codec.decoder(RATE)
+    expected = [reference.decode(encoder.encode(chunk)) for chunk in chunks]
+    encoder = codec.encoder(RATE)
+
+    gate = threading.Event()
+    done = threading.Event()
+    recognizer = RecordingRecognizer(gate)
+    pool = StreamPool(1, lambda stream, results: None, quantum=1, max_pending=3,
+                      on_closed=lambda stream: done.set())
+    stream = pool.open("device", recognizer, RATE, codec.decoder(RATE))
+    for chunk in chunks:
+        pool.feed(stream, encoder.encode(chunk))
+    gate.set()
+    pool.close(stream)
+    assert done.wait(5)
+    pool.shutdown()
+
+    assert stream.dropped > 0
+    # Whatever survived the drops decodes exactly as if nothing had been dropped
+    assert recognizer.fed and all(pcm in expected for pcm in recognizer.fed)
+    assert recognizer.fed[-1] == expected[-1]
+
+
+def test_decoding_runs_on_the_worker():
+    import audiocodec
+
+    class ThreadRecordingDecoder:
+        def __init__(self):
+            self.threads = set()
+            self._decoder = audiocodec.get_codec("adpcm").decoder(RATE)
+
+        def decode(self, data):
+            self.threads.add(threading.current_thread().name)
+            return self._decoder.decode(data)
+
+    done = threading.Event()
+    decoder = ThreadRecordingDecoder()
+    pool = StreamPool(1, lambda stream, results: None, on_closed=lambda stream: done.set())
+    stream = pool.open("device", RecordingRecognizer(), RATE, decoder)
+    encoder = audiocodec.get_codec("adpcm").encoder(RATE)
+    for _ in range(3):
+        pool.feed(stream, encoder.encode(CHUNK))
+    pool.close(stream)
+    assert done.wait(5)
+    pool.shutdown()
+    assert decoder.threads and all(name.startswith("recognizer") for name in decoder.threads)
+
+
+def test_drops_skip_every_switch_marker():
+    gate = threading.Event()
+    done = threading.Event()
+    first, second, third = RecordingRecognizer(gate), RecordingRecognizer(), RecordingRecognizer()
+    pool = StreamPool(1, lambda stream, results: None, quantum=1, max_pending=3,
+                      on_closed=lambda stream: done.set())
+    stream = pool.open("device", first, RATE)
+    pool.feed(stream, CHUNK)  # Taken by the worker, which blocks on the gate
+    pool.switch(stream, second)
+    pool.switch(stream, third)
+    pool.feed(stream, CHUNK)
+    pool.feed(stream, CHUNK)  # Queue is full: a chunk is dropped, never a switch
+    gate.set()
+    pool.close(stream)
+    assert done.wait(5)
+    pool.shutdown()
+    assert stream.recognizer is third
+    assert len(third.fed) == 1 and not second.fed
@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import queue
+import struct
+import bisect
+import argparse
+import logging
+import threading
+
+import captions
+
+logger = logging.getLogger(__name__)
+
+# Record: payload length, crc32 of the payload, caption time in epoch milliseconds
+RECORD = struct.Struct("<IIQ")
+
+# Index entry for one block of records: highest caption time up to the end of
+# the block (never decreases), lowest and highest time in the block, byte range
+INDEX = struct.Struct("<QQQQQ")
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+# One index entry per this many bytes of records
+INDEX_BYTES = 64 * 1024
+# Records are fsynced in batches at most this far apart
+SYNC_SECONDS = 1.0
+# Finals waiting for the writer; beyond this they are dropped rather than block the caller
+MAX_PENDING = 10000
+
+
+def caption_time(message):
+    """The time a final is filed under: when it ended, else when it was sent."""
+    _, metadata = captions.split_metadata(message.get("msg", ""))
+    return int(metadata.get("end_time") or message.get("ts") or captions.now_ms())
+
+
+class _Keys:
+    # Sequence view of the index's running maxima, for bisect
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // INDEX.size
+
+    def __getitem__(self, i):
+        return INDEX.unpack_from(self.data, i * INDEX.size)[0]
+
+
+def _map(path):
+    # mmap cannot map an empty file
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_records(data, start, end):
+    """Yields (time_ms, payload) from a segment's bytes, stopping at a torn record."""
+    offset = start
+    while offset + RECORD.size <= end:
+        length, crc, ts_ms = RECORD.unpack_from(data, offset)
+        payload = data[offset + RECORD.size:offset + RECORD.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            # Normal at the end of the segment being written; after a crash, the unsynced tail
+            logger.debug(f"Torn record at byte {offset}; ignoring the rest of the segment")
+            return
+        yield ts_ms, payload
+        offset += RECORD.size + length
+
+
+def segments(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".log"))
+
+
+def search_segment(path, t1, t2):
+    """
+    Yields (time_ms, payload) for records of one segment with t1 <= time <= t2.
+    The index is binary searched for the first block that can reach t1; later
+    blocks are skipped on their min/max unless they overlap the range, and only
+    the bytes not yet covered by the index (the writer's current block) are
+    scanned in full. Finals may arrive out of order (e.g. replayed after an
+    outage), which is why the index keeps a per-block range.
+    """
+    index_path = path[:-len(".log")] + ".idx"
+    index = _map(index_path) if os.path.exists(index_path) else b""
+    data = _map(path)
+    keys = _Keys(index)
+    covered = 0
+    for i in range(bisect.bisect_left(keys, t1), len(keys)):
+        _, low, high, start, end = INDEX.unpack_from(index, i * INDEX.size)
+        if low <= t2 and high >= t1:
+            yield from ((ts, p) for ts, p in read_records(data, start, end) if t1 <= ts <= t2)
+    if len(keys):
+        covered = INDEX.unpack_from(index, (len(keys) - 1) * INDEX.size)[4]
+    yield from ((ts, p) for ts, p in read_records(data, covered, len(data)) if t1 <= ts <= t2)
+
+
+def query(directory, device_id=None, t1=0, t2=2 ** 63 - 1, lang=None):
+    """Returns the finals of a device (or all devices) between t1 and t2, oldest first."""
+    results = []
+    for path in segments(directory):
+        for ts_ms, payload in search_segment(path, t1, t2):
+            message = json.loads(payload)
+            if device_id not in (None, message.get("deviceId")) or lang not in (None, message.get("lang")):
+                continue
+            results.append((ts_ms, message))
+    results.sort(key=lambda result: result[0])
+    return [message for _, message in results]
+
+
+class TranscriptLog:
+    """
+    Durable, append-only store of final captions. append() only enqueues, so
+    the publisher is never held up by the disk; a background thread writes
+    records to the current segment, fsyncs them in batches every SYNC_SECONDS,
+    adds a sparse index entry per INDEX_BYTES and starts a new segment after
+    SEGMENT_BYTES. Index entries are only written for records already synced.
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, index_bytes=INDEX_BYTES,
+                 sync_seconds=SYNC_SECONDS, max_pending=MAX_PENDING):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_bytes = index_bytes
+        self.sync_seconds = sync_seconds
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.dropped = 0
+        self.syncs = 0
+        os.makedirs(directory, exist_ok=True)
+        self._segment = self._index = None
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, message):
+        """Queues a final for writing; other messages are ignored. Never blocks."""
+        if message.get("type") != captions.FINAL:
+            return
+        try:
+            self.pending.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Transcript writer is behind; {self.dropped} finals dropped")
+
+    def _open_segment(self):
+        base = os.path.join(self.directory, f"{captions.now_ms():016d}")
+        self._segment = open(base + ".log", "ab")
+        self._index = open(base + ".idx", "ab")
+        self._size = 0
+        self._block_start = 0
+        self._block_low = self._block_high = None
+        self._running_max = 0
+        logger.info(f"Writing transcripts to {base}.log")
+
+    def _close_block(self, entries):
+        if self._block_low is not None:
+            entries.append(INDEX.pack(self._running_max, self._block_low, self._block_high,
+                                      self._block_start, self._size))
+        self._block_start = self._size
+        self._block_low = self._block_high = None
+
+    def _write(self, message, entries):
+        ts_ms = caption_time(message)
+        payload = json.dumps(message).encode()
+        self._segment.write(RECORD.pack(len(payload), zlib.crc32(payload), ts_ms) + payload)
+        self._size += RECORD.size + len(payload)
+        self._block_low = ts_ms if self._block_low is None else min(self._block_low, ts_ms)
+        self._block_high = ts_ms if self._block_high is None else max(self._block_high, ts_ms)
+        self._running_max = max(self._running_max, ts_ms)
+        if self._size - self._block_start >= self.index_bytes:
+            self._close_block(entries)
+
+    def _sync(self, entries, close=False):
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        if entries:
+            self._index.write(b"".join(entries))
+            self._index.flush()
+            os.fsync(self._index.fileno())
+            entries.clear()
+        self.syncs += 1
+        if close:
+            self._segment.close()
+            self._index.close()
+            self._segment = None
+
+    def _run(self):
+        entries = []
+        dirty = False
+        last_sync = time.monotonic()
+        while True:
+            try:
+                message = self.pending.get(timeout=self.sync_seconds)
+            except queue.Empty:
+                message = ...
+            if message is None:
+                break
+            if message is not ...:
+                if self._segment is None:
+                    self._open_segment()
+                self._write(message, entries)
+                self.written += 1
+                dirty = True
+            if dirty and time.monotonic() - last_sync >= self.sync_seconds:
+                rolled = self._size >= self.segment_bytes
+                if rolled:
+                    self._close_block(entries)
+                self._sync(entries, close=rolled)
+                dirty = False
+                last_sync = time.monotonic()
+        if self._segment is not None:
+            self._close_block(entries)
+            self._sync(entries, close=True)
+
+    def close(self):
+        """Writes and syncs everything queued, then stops the writer."""
+        self.pending.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "pending": self.pending.qsize(),
+                "syncs": self.syncs}
+
+
+def parse_time(value):
+    """Epoch milliseconds, or an ISO time such as 2024-05-01T14:00."""
+    if value.isdigit():
+        return int(value)
+    from datetime import datetime
+
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record finals to a transcript log, or query one.")
+    parser.add_argument("--dir", default="transcripts", help="Transcript log directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Subscribe to a caption hub and log its finals")
+    record.add_argument("--source", default="ws://localhost:8766/")
+    search = commands.add_parser("query", help="Print the finals of a device between two times as JSON lines")
+    search.add_argument("--device")
+    search.add_argument("--lang")
+    search.add_argument("--from", dest="start", type=parse_time, default=0, help="Epoch ms or ISO time")
+    search.add_argument("--to", dest="end", type=parse_time, default=2 ** 63 - 1, help="Epoch ms or ISO time")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "query":
+        for message in query(args.dir, args.device, args.start, args.end, args.lang):
+            sys.stdout.write(json.dumps(message) + "\n")
+        return
+
+    import websockets
+    import loops
+
+    log = TranscriptLog(args.dir)
+
+    async def consume():
+        separator = "&" if "?" in args.source else "?"
+        async for websocket in websockets.connect(f"{args.source}{separator}types=finals"):
+            try:
+                async for message in websocket:
+                    log.append(json.loads(message))
+            except websockets.exceptions.ConnectionClosed:
+                logger.warning(f"Caption source {args.source} lost; reconnecting")
+
+    try:
+        loops.run(consume())
+    finally:
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import time
+import socket
+import struct
+import logging
+import collections
+
+logger = logging.getLogger(__name__)
+
+# Frame header: payload length, frame kind. Payloads are UTF-8 caption text.
+HEADER = struct.Struct(">IB")
+PARTIAL = 0
+FINAL = 1
+
+
+def encode_frame(kind, text):
+    payload = text.encode('utf-8')
+    return HEADER.pack(len(payload), kind) + payload
+
+
+def read_frames(sock, bufsize=4096):
+    """Yields (kind, text) frames received on a socket until it is closed."""
+    buffer = b""
+    while True:
+        data = sock.recv(bufsize)
+        if not data:
+            return
+        buffer += data
+        while len(buffer) >= HEADER.size:
+            length, kind = HEADER.unpack_from(buffer)
+            end = HEADER.size + length
+            if len(buffer) < end:
+                break
+            yield kind, buffer[HEADER.size:end].decode('utf-8')
+            buffer = buffer[end:]
+
+
+class Transport:
+    """
+    A byte stream to the caption display. Subclasses only implement _open(),
+    which returns a connected socket-like object with sendall/recv/close.
+    """
+
+    name = "transport"
+
+    def __init__(self):
+        self.sock = None
+
+    def _open(self):
+        raise NotImplementedError
+
+    def connect(self):
+        self.sock = self._open()
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class RfcommTransport(Transport):
+    """Bluetooth RFCOMM via PyBluez."""
+
+    name = "rfcomm"
+
+    def __init__(self, address, port=1):
+        super().__init__()
+        self.address = address
+        self.port = port
+
+    def _open(self):
+        import bluetooth
+
+        sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        try:
+            sock.connect((self.address, self.port))
+        except bluetooth.BluetoothError as e:
+            sock.close()
+            # Surface Bluetooth failures like any other connection error
+            raise OSError(f"Could not connect to Bluetooth device {self.address}: {e}") from e
+        return sock
+
+    def sendall(self, data):
+        import bluetooth
+
+        try:
+            self.sock.sendall(data)
+        except bluetooth.BluetoothError as e:
+            raise OSError(str(e)) from e
+
+
+class TcpTransport(Transport):
+    """Plain TCP, e.g. to a display on the local network."""
+
+    name = "tcp"
+
+    def __init__(self, host, port, timeout=5):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _open(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        # Captions are small and latency matters more than packet count
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+
+class SocketPairTransport(Transport):
+    """In-process stand-in for tests and benchmarks. Read the frames from .peer."""
+
+    name = "socketpair"
+
+    def __init__(self):
+        super().__init__()
+        self.peer = None
+
+    def _open(self):
+        sock, self.peer = socket.socketpair()
+        return sock
+
+
+class CaptionLink:
+    """
+    Sends captions over a Transport with length-prefixed framing.
+
+    Finals are always sent, and are queued (up to max_queued) while the link is
+    down. Partials are coalesced: repeated text is skipped and at most one partial
+    goes out per partial_interval seconds, the newest one winning. A failed send
+    closes the transport and the link reconnects on a later call, with
+    exponential backoff, so the caller's audio loop is never blocked on retries.
+    """
+
+    def __init__(self, transport, partial_interval=0.2, max_queued=100,
+                 min_backoff=0.5, max_backoff=30.0):
+        self.transport = transport
+        self.partial_interval = partial_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connected = False
+        self._queued = collections.deque(maxlen=max_queued)
+        self._pending_partial = None
+        self._last_partial = None
+        self._last_partial_time = 0.0
+        self._backoff = min_backoff
+        self._next_attempt = 0.0
+
+        # Stats
+        self.frames = 0
+        self.bytes = 0
+        self.coalesced = 0
+        self.connections = 0
+
+    def _ensure_connected(self):
+        if self.connected:
+            return True
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return False
+        try:
+            self.transport.connect()
+        except OSError as e:
+            logger.warning(f"{self.transport.name} connect failed ({e}); retrying in {self._backoff:.1f}s")
+            self._next_attempt = now + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+            return False
+        logger.info(f"{self.transport.name} connection established")
+        self.connected = True
+        self.connections += 1
+        self._backoff = self.min_backoff
+        return True
+
+    def _send(self, frame):
+        try:
+            self.transport.sendall(frame)
+        except OSError as e:
+            logger.warning(f"{self.transport.name} send failed: {e}")
+            self.transport.close()
+            self.connected = False
+            return False
+        self.frames += 1
+        self.bytes += len(frame)
+        return True
+
+    def _flush_finals(self):
+        while self._queued:
+            if not self._send(self._queued[0]):
+                return False
+            self._queued.popleft()
+        return True
+
+    def send_final(self, text):
+        self._queued.append(encode_frame(FINAL, text))
+        # A final supersedes any partial still waiting for its turn
+        self._pending_partial = None
+        self._last_partial = None
+        if self._ensure_connected():
+            self._flush_finals()
+
+    def send_partial(self, text):
+        if text == self._last_partial or not text:
+            return
+        if self._pending_partial is not None:
+            self.coalesced += 1
+        self._pending_partial = text
+        self.poll()
+
+    def poll(self):
+        """Sends the pending partial if its interval has passed. Safe to call often."""
+        if self._pending_partial is None:
+            return
+        now = time.monotonic()
+        if now - self._last_partial_time < self.partial_interval:
+            return
+        if not self._ensure_connected() or not self._flush_finals():
+            return
+        if self._send(encode_frame(PARTIAL, self._pending_partial)):
+            self._last_partial = self._pending_partial
+            self._last_partial_time = now
+            self._pending_partial = None
+
+    def stats(self):
+        return {
+            "transport": self.transport.name,
+            "connected": self.connected,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "coalescedPartials": self.coalesced,
+            "queuedFinals": len(self._queued),
+            "connections": self.connections,
+        }
+
+    def close(self):
+        self.transport.close()
+        self.connected = False
+
+
+def create_transport(spec):
+    """
+    Builds a transport from a spec string:
+    rfcomm:XX:XX:XX:XX:XX:XX[@port], tcp:host:port or socketpair.
+    """
+    kind, _, target = spec.partition(":")
+    if kind == "rfcomm":
+        address, _, port = target.partition("@")
+        return RfcommTransport(address, int(port or 1))
+    if kind == "tcp":
+        host, _, port = target.rpartition(":")
+        return TcpTransport(host, int(port))
+    if kind == "socketpair":
+        return SocketPairTransport()
+    raise ValueError(f"Unknown transport {spec}; expected rfcomm:, tcp: or socketpair")
@@ -0,0 +1,262 @@
+import json
+import time
+import struct
+import random
+import asyncio
+import logging
+import threading
+import collections
+
+import websockets
+
+import audiocodec
+
+logger = logging.getLogger(__name__)
+
+# With a spool, every binary message starts with a channel byte and the capture
+# time (epoch ms) of its first frame, so the server can tell catch-up audio apart
+TAG = struct.Struct("<BQ")
+LIVE = 0
+CATCHUP = 1
+
+
+class UplinkSender:
+    """
+    Streams audio frames to the ingest server.
+
+    push() is safe to call from the audio callback thread and never blocks: frames
+    go into a bounded queue (the oldest are dropped when it is full), and a single
+    sender task coalesces whatever is queued into one WebSocket message. The
+    connection is re-established with jittered exponential backoff while capture
+    keeps running.
+
+    With a spool (see spool.py), frames captured while the link is down are
+    written to disk instead of dropped. After reconnecting they are sent as
+    catch-up audio, `catchup_ratio` spooled messages per live message, so live
+    captions keep priority while the backlog drains faster than real time.
+
+    With `codecs`, the sender offers those codecs (see audiocodec.py) in its
+    handshake, waits for the server to pick one, and encodes every message with
+    it. Frames are queued and spooled as raw PCM and only encoded when sent.
+    """
+
+    def __init__(self, url, hello=None, max_frames=50, max_batch=8,
+                 min_backoff=0.5, max_backoff=30.0, spool=None, catchup_ratio=2,
+                 codecs=None, rate=16000):
+        self.url = url
+        self.hello = dict(hello or {})
+        self.spool = spool
+        self.catchup_ratio = catchup_ratio
+        self.codecs = codecs
+        self.rate = rate
+        if spool is not None:
+            self.hello["framing"] = "tagged"
+        if codecs:
+            self.hello["codecs"] = list(codecs)
+        self.codec = "pcm"
+        self._encoders = None  # channel -> encoder for the current connection
+        self.max_frames = max_frames
+        self.max_batch = max_batch
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self._frames = collections.deque()  # (capture monotonic time, bytes)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._idle = False
+
+        # Stats
+        self.connected = False
+        self.reconnects = 0
+        self.sent_frames = 0
+        self.sent_messages = 0
+        self.dropped = 0
+        self.catchup_messages = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.send_latency = 0.0  # capture to send completion of the last message
+        self.max_send_latency = 0.0
+
+    @property
+    def queue_depth(self):
+        return len(self._frames)
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "queueDepth": self.queue_depth,
+            "sentFrames": self.sent_frames,
+            "sentMessages": self.sent_messages,
+            "dropped": self.dropped,
+            "spooled": len(self.spool) if self.spool is not None else 0,
+            "catchupMessages": self.catchup_messages,
+            "codec": self.codec,
+            "rawBytes": self.raw_bytes,
+            "sentBytes": self.sent_bytes,
+            "reconnects": self.reconnects,
+            "sendLatencyMs": int(self.send_latency * 1000),
+            "maxSendLatencyMs": int(self.max_send_latency * 1000),
+        }
+
+    def push(self, data):
+        """Queues one audio frame. Called from the audio callback thread."""
+        if self.spool is not None and not self.connected:
+            self.spool.append(int(time.time() * 1000), data)
+            return
+        with self._lock:
+            if len(self._frames) >= self.max_frames:
+                self._discard(self._frames.popleft())
+            self._frames.append((time.monotonic(), data))
+            wake = self._idle
+            self._idle = False
+        # Only poke the event loop when the sender is actually waiting for frames
+        if wake and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _discard(self, frame):
+        # Must be called with the lock held
+        if self.spool is not None:
+            captured, data = frame
+            self.spool.append(self._wall_ms(captured), data)
+        else:
+            self.dropped += 1
+
+    def _wall_ms(self, captured):
+        return int((time.time() - (time.monotonic() - captured)) * 1000)
+
+    def _spill(self):
+        """Moves queued live frames to the spool when the connection goes down."""
+        if self.spool is None:
+            return
+        with self._lock:
+            while self._frames:
+                self._discard(self._frames.popleft())
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(self.max_batch, len(self._frames))
+            batch = [self._frames.popleft() for _ in range(count)]
+            if not batch:
+                self._idle = True
+            return batch
+
+    def _requeue(self, batch):
+        # Put unsent frames back at the front so a reconnect resumes where it left off
+        with self._lock:
+            self._frames.extendleft(reversed(batch))
+            while len(self._frames) > self.max_frames:
+                self._discard(self._frames.popleft())
+
+    def _message(self, channel, ts_ms, frames):
+        data = b"".join(frames)
+        self.raw_bytes += len(data)
+        if self._encoders is not None:
+            data = self._encoders[channel].encode(data)
+        self.sent_bytes += len(data)
+        if self.spool is None:
+            return data
+        return TAG.pack(channel, ts_ms) + data
+
+    async def _send_live(self, websocket, batch):
+        # When the link is slow frames pile up and go out as one larger message
+        message = self._message(LIVE, self._wall_ms(batch[0][0]), [data for _, data in batch])
+        try:
+            await websocket.send(message)
+        except BaseException:
+            self._requeue(batch)
+            raise
+        self.send_latency = time.monotonic() - batch[0][0]
+        self.max_send_latency = max(self.max_send_latency, self.send_latency)
+        self.sent_frames += len(batch)
+        self.sent_messages += 1
+
+    async def _send_catchup(self, websocket):
+        # Frames stay at the head of the spool until sent, so after a failed send
+        # the reconnect resumes with the same (oldest) audio
+        frames, offset = self.spool.peek(self.max_batch)
+        if not frames:
+            return False
+        await websocket.send(self._message(CATCHUP, frames[0][0], [data for _, data in frames]))
+        self.spool.commit(offset)
+        self.catchup_messages += 1
+        return True
+
+    async def _send_frames(self, websocket):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                await self._send_live(websocket, batch)
+
+            caught_up = 0
+            while self.spool is not None and caught_up < self.catchup_ratio:
+                if not await self._send_catchup(websocket):
+                    break
+                caught_up += 1
+
+            if not batch and not caught_up:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+
+    async def _drain_messages(self, websocket):
+        async for message in websocket:
+            pass
+
+    async def _session(self, websocket):
+        self._encoders = None
+        self.codec = "pcm"
+        if self.hello:
+            await websocket.send(json.dumps(self.hello))
+        if self.codecs:
+            # The server answers the handshake with the codec it picked
+            reply = await asyncio.wait_for(websocket.recv(), 10)
+            try:
+                reply = json.loads(reply)
+                if not isinstance(reply, dict):
+                    raise ValueError(f"expected a JSON object, got {reply!r}")
+                codec = audiocodec.get_codec(reply.get("codec", "pcm"))
+            except (ValueError, TypeError) as e:
+                # Raised as a WebSocket error so run() backs off and reconnects as for any lost link
+                raise websockets.exceptions.InvalidMessage(f"Bad handshake reply: {e}") from e
+            self.codec = reply.get("codec", "pcm")
+            # Each channel is a separate stream on the server, with its own codec state
+            self._encoders = {LIVE: codec.encoder(self.rate), CATCHUP: codec.encoder(self.rate)}
+            logger.info(f"Uplink codec: {self.codec}")
+        tasks = [
+            asyncio.ensure_future(self._send_frames(websocket)),
+            asyncio.ensure_future(self._drain_messages(websocket)),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(self):
+        """Keeps the uplink connected until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        backoff = self.min_backoff
+        while True:
+            try:
+                async with websockets.connect(self.url, compression=None) as websocket:
+                    self.connected = True
+                    backoff = self.min_backoff
+                    logger.info(f"Connected to {self.url}")
+                    await self._session(websocket)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logger.warning(f"Uplink to {self.url} lost ({e}); retrying in ~{backoff:.1f}s")
+            finally:
+                self.connected = False
+                self._spill()
+            self.reconnects += 1
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def report(self, interval=10):
+        """Logs uplink stats periodically."""
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Uplink: {self.stats()}")
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+
+import audio
+import models
+from engines import create_engine
+from procpool import ProcessStreamPool
+from streampool import StreamPool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def feed_stream(pool, stream, chunks, chunk_ms, realtime):
+    """Feeds one file's chunks, at the pace of a live microphone if realtime."""
+    start = time.monotonic()
+    for index, chunk in enumerate(chunks):
+        if realtime:
+            delay = start + index * chunk_ms / 1000 - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        pool.feed(stream, chunk)
+    pool.close(stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcribe many audio feeds at once with one shared Vosk model on all cores."
+    )
+    parser.add_argument("paths", nargs="+", help="WAV files or directories; each file is one stream")
+    parser.add_argument("--engine", default="vosk", help="vosk, or fake for a recognizer stand-in")
+    models.add_model_arguments(parser)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--processes", action="store_true",
+                        help="Use worker processes (forked with the model preloaded) instead of threads")
+    parser.add_argument("--quantum", type=int, default=4,
+                        help="Chunks a worker decodes for one stream before serving the next")
+    parser.add_argument("--partial-every", type=int, default=1,
+                        help="Evaluate Vosk partial results only every N chunks")
+    parser.add_argument("--chunk-ms", type=int, default=250)
+    parser.add_argument("--realtime", action="store_true",
+                        help="Feed every file at live speed, like many microphones at once")
+    args = parser.parse_args()
+
+    engine_options = {}
+    context = None
+    if args.engine == "vosk":
+        model_path = models.resolve_from_args(parser, args, interactive=False)
+        engine_options = {"model_path": model_path, "partial_every": args.partial_every}
+        if args.processes:
+            context = models.preloaded_context(model_path)
+
+    transcripts = {}
+    finished = {}
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_results(stream, results):
+        with lock:
+            transcripts.setdefault(stream.key, []).extend(text for is_final, text in results if is_final and text)
+
+    def on_closed(stream):
+        with lock:
+            finished[stream.key] = stream.stats()
+            if len(finished) == len(files):
+                done.set()
+
+    files = audio.find_wavs(args.paths)
+    if not files:
+        parser.error("no WAV files found")
+    feeds = [(path,) + audio.read_wav_chunks(path, args.chunk_ms) for path in files]
+
+    # Offline runs queue everything; live runs drop the oldest audio when a stream falls behind
+    max_pending = 100 if args.realtime else None
+    if args.processes:
+        pool = ProcessStreamPool(args.engine, engine_options, on_results, workers=args.workers,
+                                 quantum=args.quantum, max_pending=max_pending,
+                                 on_closed=on_closed, context=context)
+        open_stream = lambda path, rate: pool.open(path, rate)
+    else:
+        engine = create_engine(args.engine, **engine_options)
+        pool = StreamPool(args.workers, on_results, quantum=args.quantum,
+                          max_pending=max_pending, on_closed=on_closed)
+        open_stream = lambda path, rate: pool.open(path, engine.open_stream("en", rate), rate)
+
+    start = time.monotonic()
+    feeders = []
+    for path, rate, chunks in feeds:
+        stream = open_stream(path, rate)
+        feeder = threading.Thread(target=feed_stream, args=(pool, stream, chunks, args.chunk_ms, args.realtime))
+        feeder.start()
+        feeders.append(feeder)
+    for feeder in feeders:
+        feeder.join()
+    done.wait()
+    wall = time.monotonic() - start
+    pool.shutdown()
+
+    for path in files:
+        print(json.dumps({"file": path, "text": " ".join(transcripts.get(path, [])), **finished[path]}))
+    # A stream whose worker died has only the stats it last reported, possibly none
+    audio_seconds = sum(stats.get("audioSeconds", 0) for stats in finished.values())
+    summary = {
+        "streams": len(files),
+        "workers": args.workers,
+        "mode": "processes" if args.processes else "threads",
+        "audioSeconds": round(audio_seconds, 1),
+        "wallSeconds": round(wall, 2),
+        "speedup": round(audio_seconds / wall, 1),  # seconds of audio transcribed per wall second
+        "maxLagMs": max(stats.get("maxLagMs", 0) for stats in finished.values()),
+        "failedStreams": sum(1 for stats in finished.values() if stats.get("error")),
+    }
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()